@@ -0,0 +1,145 @@
+import ast
+import builtins
+import functools
+
+BUILTIN_NAMES = set(dir(builtins)) | {"__name__", "__file__", "__doc__"}
+PURE_CALLS = {"print", "input", "len", "str", "int", "float", "bool", "range", "abs", "min", "max", "round", "sum"}
+
+
+class Finding:
+    def __init__(self, kind, line, message):
+        self.kind = kind
+        self.line = line
+        self.message = message
+
+    def __repr__(self):
+        return f"Finding({self.kind!r}, {self.line}, {self.message!r})"
+
+
+# --- CHECKS ---
+def _syntax_finding(error):
+    line = error.lineno or 1
+    if isinstance(error, IndentationError):
+        return Finding(
+            "indentation", line,
+            f"Line {line}: Python is confused by the indentation here ({error.msg}). "
+            "Which block should this line belong to, and do the lines in that block all line up?"
+        )
+    return Finding(
+        "syntax", line,
+        f"Line {line}: Python can't read this line ({error.msg}). "
+        "Look closely at the brackets, quotes and colons around it - is anything left open or missing?"
+    )
+
+
+def _bound_names(tree):
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif type(node).__name__ in ("MatchAs", "MatchStar") and node.name:
+            names.add(node.name)
+    return names
+
+
+def find_undefined_names(tree):
+    bound = _bound_names(tree) | BUILTIN_NAMES
+    if any(isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names) for node in ast.walk(tree)):
+        return []
+    findings, seen = [], set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in bound:
+            if node.id in seen:
+                continue
+            seen.add(node.id)
+            findings.append(Finding(
+                "undefined", node.lineno,
+                f"Line {node.lineno}: `{node.id}` is used but never created anywhere. "
+                "Is it a typo, or did you forget to assign it before this line?"
+            ))
+    return sorted(findings, key=lambda f: f.line)
+
+
+def _loop_exits(loop):
+    """True if something inside `loop` (outside nested loops) can end it."""
+    stack = list(loop.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.Break, ast.Return, ast.Raise)):
+            return True
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", None)
+            if name in ("exit", "quit", "_exit"):
+                return True
+        if isinstance(node, (ast.While, ast.For, ast.AsyncFor, ast.FunctionDef, ast.AsyncFunctionDef,
+                             ast.ClassDef, ast.Lambda)):
+            # A break in here ends the inner loop, not this one
+            continue
+        stack.extend(ast.iter_child_nodes(node))
+    return False
+
+
+def find_endless_loops(tree):
+    findings = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.While) or _loop_exits(node):
+            continue
+        if isinstance(node.test, ast.Constant) and node.test.value:
+            findings.append(Finding(
+                "endless_loop", node.lineno,
+                f"Line {node.lineno}: this `while {ast.unparse(node.test)}:` loop has no `break`, "
+                "so it will never stop. What should happen to make the loop finish?"
+            ))
+            continue
+        tested = {n.id for n in ast.walk(node.test) if isinstance(n, ast.Name)}
+        changed = {n.id for child in node.body for n in ast.walk(child)
+                   if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)}
+        calls = any(isinstance(n, ast.Call) for n in ast.walk(node.test))
+        # Method calls and user functions might change the tested names behind our back
+        mutates = any(isinstance(n, ast.Call) and not (isinstance(n.func, ast.Name) and n.func.id in PURE_CALLS)
+                      for child in node.body for n in ast.walk(child))
+        if tested and not calls and not mutates and not (tested & changed):
+            names = ", ".join(f"`{name}`" for name in sorted(tested))
+            findings.append(Finding(
+                "endless_loop", node.lineno,
+                f"Line {node.lineno}: nothing inside this loop changes {names}, so once "
+                f"`{ast.unparse(node.test)}` is true it stays true forever. What needs to change each time around?"
+            ))
+    return sorted(findings, key=lambda f: f.line)
+
+
+# --- ENTRY POINT ---
+@functools.lru_cache(maxsize=512)
+def analyze(code):
+    """Findings for the common beginner mistakes in `code`, cached per code text.
+
+    An empty result means nothing obvious was found and the question should
+    go to the AI tutor.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return (_syntax_finding(e),)
+    return tuple(find_undefined_names(tree) + find_endless_loops(tree))
+
+
+def findings_message(findings):
+    lines = ["🔎 I ran a quick check on your code and spotted something to look at:"]
+    lines += [f"- {finding.message}" for finding in findings]
+    lines.append("\nTry fixing that first, then ask me again if you're still stuck!")
+    return "\n".join(lines)
+
+
+NO_FINDINGS_NOTE = "(Automatic checks found no syntax errors, undefined names or endless loops.)"
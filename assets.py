@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import re
+import sys
+
+ASSET_DIR = os.environ.get("LEXIQ_ASSET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
+STYLESHEET = "lexiq.css"
+SCRIPTS = ("editor.js",)
+
+
+# --- MINIFY ---
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text):
+    """Drop comments, indentation and blank lines.
+
+    Line breaks are kept so automatic semicolon insertion still works; only
+    whole-line `//` comments are removed, which keeps strings and regex
+    literals safe without a real parser.
+    """
+    lines = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+# --- BUNDLE ---
+def _js_string(text):
+    # Keep "</script>" inside the bundle from closing the loader's script tag
+    return json.dumps(text).replace("</", "<\\/")
+
+
+class Bundle:
+    """Minified stylesheet and scripts plus a short content hash."""
+
+    def __init__(self, css, js, raw_bytes=0):
+        self.css = css
+        self.js = js
+        self.raw_bytes = raw_bytes
+        self.hash = hashlib.sha256(f"{css}\0{js}".encode()).hexdigest()[:12]
+
+    @property
+    def size(self):
+        return len(self.css.encode()) + len(self.js.encode())
+
+    def loader(self):
+        """HTML for a zero-height component that installs the bundle on the app page.
+
+        The style and script elements go into the parent document, so they
+        outlive the component and only have to be sent once per session. A
+        bundle with a different hash replaces the previous one.
+        """
+        return (
+            "<script>(function(){"
+            "const doc=window.parent.document;"
+            f"const id={_js_string('lexiq-assets-' + self.hash)};"
+            "if(doc.getElementById(id))return;"
+            "doc.querySelectorAll('[data-lexiq-assets]').forEach(function(el){el.remove();});"
+            "const style=doc.createElement('style');"
+            "style.id=id;style.dataset.lexiqAssets='css';"
+            f"style.textContent={_js_string(self.css)};"
+            "doc.head.appendChild(style);"
+            "const script=doc.createElement('script');"
+            "script.dataset.lexiqAssets='js';"
+            f"script.textContent={_js_string(self.js)};"
+            "doc.head.appendChild(script);"
+            "})();</script>"
+        )
+
+
+def build(asset_dir=ASSET_DIR):
+    with open(os.path.join(asset_dir, STYLESHEET), 'r') as f:
+        css = f.read()
+    scripts = []
+    for name in SCRIPTS:
+        with open(os.path.join(asset_dir, name), 'r') as f:
+            scripts.append(f.read())
+    raw_bytes = len(css.encode()) + sum(len(script.encode()) for script in scripts)
+    return Bundle(minify_css(css), "\n".join(minify_js(script) for script in scripts), raw_bytes)
+
+
+def main(argv=None):
+    bundle = build()
+    loader = len(bundle.loader().encode())
+    print(f"bundle {bundle.hash}: {bundle.raw_bytes} bytes raw, {bundle.size} minified, {loader} as loader")
+    print(f"sent once per session instead of {bundle.raw_bytes} bytes on every rerun")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
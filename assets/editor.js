@@ -0,0 +1,64 @@
+// Tab and auto-indent support for the code workspaces.
+// Installed once per page on the app document; a single delegated listener
+// covers textareas that Streamlit adds or re-renders later.
+(function () {
+    if (window.lexiqEditorInstalled) {
+        return;
+    }
+    window.lexiqEditorInstalled = true;
+
+    // Streamlit tags each widget's container with its key; other textareas keep their normal keys
+    const EDITORS = ['code_workspace', 'exercise_code', 'project_workspace']
+        .map(function (key) { return '.st-key-' + key + ' textarea'; })
+        .join(', ');
+
+    // React tracks the value it last rendered, so assigning .value alone is
+    // undone on its next render and never reaches Streamlit. Going through
+    // the native setter and firing `input` makes it a real edit.
+    function setValue(textarea, value) {
+        const view = textarea.ownerDocument.defaultView;
+        const setter = Object.getOwnPropertyDescriptor(view.HTMLTextAreaElement.prototype, 'value').set;
+        setter.call(textarea, value);
+        textarea.dispatchEvent(new view.Event('input', { bubbles: true }));
+    }
+
+    document.addEventListener('keydown', function (e) {
+        const textarea = e.target;
+        if (!textarea || textarea.tagName !== 'TEXTAREA' || !textarea.matches(EDITORS)) {
+            return;
+        }
+
+        // Tab key support
+        if (e.key === 'Tab') {
+            e.preventDefault();
+            const start = textarea.selectionStart;
+            const end = textarea.selectionEnd;
+            const value = textarea.value;
+
+            // Insert 4 spaces
+            setValue(textarea, value.substring(0, start) + '    ' + value.substring(end));
+            textarea.selectionStart = textarea.selectionEnd = start + 4;
+        }
+
+        // Auto-indent on Enter
+        if (e.key === 'Enter') {
+            const start = textarea.selectionStart;
+            const value = textarea.value;
+            const lines = value.substring(0, start).split('\n');
+            const currentLine = lines[lines.length - 1];
+
+            // Count leading spaces
+            const leadingSpaces = currentLine.match(/^\s*/)[0];
+
+            // Check if line ends with : (function, if, for, while, etc.)
+            const needsExtraIndent = currentLine.trim().endsWith(':');
+
+            setTimeout(function () {
+                const newStart = textarea.selectionStart;
+                const indent = needsExtraIndent ? leadingSpaces + '    ' : leadingSpaces;
+                setValue(textarea, textarea.value.substring(0, newStart) + indent + textarea.value.substring(newStart));
+                textarea.selectionStart = textarea.selectionEnd = newStart + indent.length;
+            }, 0);
+        }
+    }, true);
+})();
@@ -0,0 +1,423 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import curriculum
+import leaderboard
+import metrics
+import runner
+import storage
+
+
+class CountingStorage(storage.Storage):
+    """Wraps a storage engine and counts the writes (each one a commit/fsync)."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.writes = 0
+
+    def load_progress(self, username):
+        return self.inner.load_progress(username)
+
+    def save_progress(self, username, progress, fields=None):
+        self.writes += 1
+        self.inner.save_progress(username, progress, fields)
+
+    def append_event(self, username, kind, amount, ref=None):
+        self.writes += 1
+        return self.inner.append_event(username, kind, amount, ref)
+
+    def events_after(self, username, after_id):
+        return self.inner.events_after(username, after_id)
+
+    def load_snapshot(self, username):
+        return self.inner.load_snapshot(username)
+
+    def save_snapshot(self, username, last_event_id, state, prune=False):
+        self.writes += 1
+        self.inner.save_snapshot(username, last_event_id, state, prune)
+
+
+def simulate_session(progress, reruns, rng):
+    """Yields once per rerun after applying the kind of mutations the UI makes.
+
+    Quiz answers and code runs change the document; points and completions
+    are yielded as (kind, amount, ref) awards, or None when nothing was won.
+    """
+    for _ in range(reruns):
+        roll = rng.random()
+        award = None
+        if roll < 0.15:
+            award = ('chat', 5, None)
+        elif roll < 0.25:
+            scores = progress['quiz_scores'].setdefault(f"lesson_{rng.randrange(20)}", {})
+            tally = scores.setdefault(str(rng.randrange(5)), [0, 0])
+            correct = rng.random() < 0.7
+            tally[0] += 1
+            tally[1] += int(correct)
+            if correct:
+                award = ('quiz', 10, None)
+        elif roll < 0.30:
+            progress['code_submissions'].append({'lesson': f"lesson_{rng.randrange(20)}", 'passed': rng.random() < 0.5})
+        elif roll < 0.31:
+            award = ('lesson', 50, f"lesson_{rng.randrange(1000)}")
+        yield award
+
+
+# --- PROGRESS WRITES ---
+def bench_progress(args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        eager = CountingStorage(storage.SqliteStorage(os.path.join(tmp, "eager.db")))
+        lazy = CountingStorage(storage.SqliteStorage(os.path.join(tmp, "lazy.db")))
+        writer = storage.ProgressWriter(lazy, interval=args.interval)
+        log = storage.ProgressLog(lazy)
+
+        eager_time = lazy_time = 0.0
+        for session in range(args.sessions):
+            username = f"student{session}"
+
+            progress = storage.default_progress()
+            start = time.perf_counter()
+            for award in simulate_session(progress, args.reruns, random.Random(rng.random())):
+                # Old behaviour: points live in the document, saved whole at the top of every rerun
+                if award is not None:
+                    storage.apply_event(progress, *award)
+                progress['last_login'] = 'now'
+                eager.save_progress(username, progress)
+            eager_time += time.perf_counter() - start
+
+            progress = storage.default_progress()
+            start = time.perf_counter()
+            log.load(username, progress)
+            writer.track(username, lazy.load_progress(username))
+            for award in simulate_session(progress, args.reruns, random.Random(rng.random())):
+                # Awards go to the event log, everything else through the write-behind writer
+                if award is not None:
+                    storage.apply_event(progress, *award)
+                    log.record(username, *award)
+                writer.mark(username, progress)
+                if args.think_time:
+                    time.sleep(args.think_time)
+            writer.mark(username, progress)
+            writer.flush(username)  # logout
+            lazy_time += time.perf_counter() - start
+        writer.close()
+
+    print(f"sessions={args.sessions} reruns/session={args.reruns} interval={args.interval}s")
+    print(f"{'':<14}{'writes':>10}{'per session':>14}{'ms/rerun':>12}")
+    for label, store, elapsed in (("save-per-rerun", eager, eager_time), ("write-behind", lazy, lazy_time)):
+        per_rerun = elapsed / (args.sessions * args.reruns) * 1000
+        print(f"{label:<14}{store.writes:>10}{store.writes / args.sessions:>14.1f}{per_rerun:>12.3f}")
+    saved = eager.writes - lazy.writes
+    print(f"fsyncs saved per session: {saved / args.sessions:.1f}")
+
+
+# --- CODE EXECUTION ---
+EXEC_SAMPLE = (
+    "def square(number):\n"
+    "    return number * number\n"
+    "for i in range(1, 11):\n"
+    "    if i != 5:\n"
+    "        print(square(i))\n"
+)
+EXEC_TESTS = [{"name": "square(5) returns 25", "check": "square(5) == 25"}]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(run, runs, clients):
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        verdicts = list(pool.map(lambda _: run(EXEC_SAMPLE, EXEC_TESTS), range(runs)))
+    failed = sum(1 for verdict in verdicts if not verdict.passed)
+    latencies = [verdict.duration * 1000 for verdict in verdicts]
+    return statistics.median(latencies), percentile(latencies, 99), failed
+
+
+def bench_exec(args):
+    print(f"runs={args.runs} concurrent clients={args.clients}")
+    print(f"{'runner':<22}{'p50 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    for size in args.sizes:
+        cold = runner.ExerciseRunner(max_workers=size)
+        p50, p99, failed = measure(cold.run, args.runs, args.clients)
+        print(f"{f'fresh process x{size}':<22}{p50:>10.1f}{p99:>10.1f}{failed:>8}")
+
+        pool = runner.WarmPool(size=size, max_runs=args.max_runs)
+        measure(pool.run, size, size)  # let every worker finish starting
+        p50, p99, failed = measure(pool.run, args.runs, args.clients)
+        print(f"{f'warm pool x{size}':<22}{p50:>10.1f}{p99:>10.1f}{failed:>8}")
+        pool.close()
+
+
+# --- LEADERBOARD ---
+def bench_leaderboard(args):
+    rng = random.Random(args.seed)
+    usernames = [f"student{i}" for i in range(args.users)]
+    start = time.perf_counter()
+    board = leaderboard.Leaderboard({username: rng.randrange(5000) for username in usernames})
+    print(f"users={args.users} build={(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"{'operation':<12}{'p50 us':>10}{'p99 us':>10}")
+    operations = (
+        ("rank", lambda username: board.rank(username)),
+        ("award", lambda username: board.add(username, rng.choice((5, 10, 50, 100)))),
+        ("top 10", lambda username: board.top(10)),
+    )
+    for label, operation in operations:
+        samples = []
+        for _ in range(args.queries):
+            username = rng.choice(usernames)
+            start = time.perf_counter()
+            operation(username)
+            samples.append((time.perf_counter() - start) * 1e6)
+        print(f"{label:<12}{statistics.median(samples):>10.1f}{percentile(samples, 99):>10.1f}")
+
+
+# --- INSTRUCTOR INSIGHTS ---
+def synthesize(store, users, rng):
+    """Bulk-load `users` students who drop off along the course, with quiz tallies and events."""
+    import insights
+    columns, _, question_number = insights.layout()
+    lessons = [str(lesson_id) for lesson_id in columns["lesson_ids"]]
+    position = {lesson_id: i for i, lesson_id in enumerate(lessons)}
+    now = datetime.now().isoformat()
+    event_id = 0
+    accounts, documents, events, snapshots = [], [], [], []
+    for i in range(users):
+        username = f"student{i}"
+        accounts.append((username, "x", now))
+        reached = 0
+        while reached < len(lessons) and rng.random() < 0.8:
+            reached += 1
+        scores = {}
+        for lesson_id, number in question_number:
+            if position[lesson_id] <= reached and rng.random() < 0.7:
+                tries = 1 + int(rng.random() < 0.3)
+                scores.setdefault(lesson_id, {})[number] = [tries, int(rng.random() < 0.75)]
+        documents.append((username, 'quiz_scores', json.dumps(scores)))
+        documents.append((username, 'code_submissions', '[]'))
+        history = [('lesson', 50, lesson_id) for lesson_id in lessons[:reached]]
+        history += [(rng.choice(('chat', 'quiz')), 5, None) for _ in range(rng.randrange(10))]
+        first = event_id + 1
+        for kind, amount, ref in history:
+            event_id += 1
+            events.append((event_id, username, kind, amount, ref, now))
+        if history and rng.random() < 0.3:
+            # Some students already have a snapshot covering their first events
+            folded = history[:len(history) // 2]
+            state = {'total_points': 0, 'completed_lessons': []}
+            for kind, amount, ref in folded:
+                storage.apply_event(state, kind, amount, ref)
+            snapshots.append((username, first + len(folded) - 1, json.dumps(state)))
+    with store.pool.connection() as conn, conn:
+        conn.executemany("INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)", accounts)
+        conn.executemany("INSERT INTO progress (username, field, value) VALUES (?, ?, ?)", documents)
+        conn.executemany(
+            "INSERT INTO progress_events (id, username, kind, amount, ref, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            events
+        )
+        conn.executemany(
+            "INSERT INTO progress_snapshots (username, last_event_id, state) VALUES (?, ?, ?)", snapshots
+        )
+    return len(events)
+
+
+def bench_insights(args):
+    import insights  # needs NumPy, which the other benchmarks don't
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "insights.db")
+        store = storage.SqliteStorage(path)
+        start = time.perf_counter()
+        events = synthesize(store, args.users, random.Random(args.seed))
+        store.close()
+        print(f"users={args.users} events={events} generated in {time.perf_counter() - start:.1f}s")
+        print(f"{'workers':<10}{'seconds':>10}{'users/s':>12}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            result = insights.build("sqlite", path, workers)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:<10}{elapsed:>10.2f}{args.users / elapsed:>12.0f}")
+        out = os.path.join(tmp, "insights.npz")
+        result.save(out)
+        print(f"output: {os.path.getsize(out)} bytes; "
+              f"finished the course: {result.funnel()[-1][3]:.0%}; median points: {result.points_percentile(50)}+")
+
+
+# --- METRICS OVERHEAD ---
+# What a logged-in rerun records: progress.mark, state.sync, the page and the rerun itself
+TIMED_PER_RERUN = 4
+
+
+def bench_metrics(args):
+    registry = metrics.Registry()
+
+    def timed_block():
+        with registry.time("bench.block"):
+            pass
+
+    operations = (
+        ("timed block", timed_block),
+        ("timer observe", lambda: registry.timer("bench.observe").observe(0.001)),
+        ("counter inc", lambda: registry.counter("bench.count", site="assistant").inc()),
+        ("histogram", lambda: registry.histogram("bench.hist", metrics.LATENCY_BUCKETS, site="assistant").observe(0.7)),
+    )
+    print(f"runs={args.runs}")
+    print(f"{'operation':<16}{'us/op':>10}")
+    costs = {}
+    for label, operation in operations:
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            operation()
+        costs[label] = (time.perf_counter() - start) / args.runs * 1e6
+        print(f"{label:<16}{costs[label]:>10.2f}")
+    start = time.perf_counter()
+    export = registry.export()
+    print(f"export: {(time.perf_counter() - start) * 1000:.2f} ms, {len(export)} bytes (off the request path)")
+    per_rerun = TIMED_PER_RERUN * costs["timed block"]
+    # Compare against the measured rerun times from `bench.py fragments`, not a guessed figure
+    print(f"per rerun: {per_rerun:.1f} us for {TIMED_PER_RERUN} timed blocks")
+
+
+# --- FRAGMENT RERUNS ---
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def fragment_scenarios(lesson_id):
+    """(label, page, fragment timer, interaction) for the interactions that now rerun a fragment."""
+    def answer_quiz(at, n):
+        at.button(key=f"submit_{lesson_id}_0").click()
+
+    def type_code(at, n):
+        at.text_area(key="code_workspace").input(f"{EXEC_SAMPLE}print({n})\n")
+
+    return [
+        ("quiz answer", "📚 Learn", "fragment.quiz_question", answer_quiz),
+        ("editor input", "🤖 AI Assistant", "fragment.code_workspace", type_code),
+    ]
+
+
+def bench_fragments(args):
+    from streamlit.testing.v1 import AppTest
+
+    lesson_id = next(iter(curriculum.INDEX.lessons))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # keep the app's database and caches out of the working tree
+        try:
+            print(f"runs={args.runs} (full script rerun vs. the fragment body that reruns instead)")
+            print(f"{'interaction':<16}{'full p50':>10}{'full p99':>10}{'frag p50':>10}{'frag p99':>10}{'speedup':>9}")
+            for label, page, timer_name, interact in fragment_scenarios(lesson_id):
+                at = AppTest.from_file(APP_PATH, default_timeout=30)
+                at.session_state["logged_in"] = True
+                at.session_state["username"] = "bench"
+                at.session_state["user_progress"] = storage.default_progress()
+                at.session_state["current_lesson"] = lesson_id
+                at.run()
+                at.sidebar.radio[0].set_value(page).run()
+
+                full = []
+                for n in range(args.warmup + args.runs):
+                    if n == args.warmup:
+                        metrics.REGISTRY.reset()
+                    interact(at, n)
+                    start = time.perf_counter()
+                    at.run()
+                    if n >= args.warmup:
+                        full.append((time.perf_counter() - start) * 1000)
+                # AppTest always reruns the whole script, which includes one run of the fragment body
+                timer = metrics.REGISTRY.timer(timer_name)
+                frag_p50, frag_p99 = timer.percentile(50) * 1000, timer.percentile(99) * 1000
+                full_p50 = statistics.median(full)
+                print(f"{label:<16}{full_p50:>10.1f}{percentile(full, 99):>10.1f}"
+                      f"{frag_p50:>10.1f}{frag_p99:>10.1f}{full_p50 / max(frag_p50, 1e-6):>8.1f}x")
+        finally:
+            os.chdir(cwd)
+
+
+# --- COLD START ---
+COLDSTART_SCRIPT = """
+import json, time
+start = time.perf_counter()
+if {eager}:
+    import groq, httpx  # what main.py used to import up front
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({app!r}, default_timeout=60).run()
+print(json.dumps({{"paint": time.perf_counter() - start}}))
+"""
+
+
+def bench_coldstart(args):
+    print(f"runs={args.runs} (fresh interpreter each run, login page rendered through AppTest)")
+    print(f"{'imports':<14}{'first paint p50':>16}{'p99':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, eager in (("eager SDK", True), ("lazy SDK", False)):
+            paints = []
+            for _ in range(args.runs):
+                script = COLDSTART_SCRIPT.format(eager=eager, app=APP_PATH)
+                out = subprocess.run([sys.executable, "-c", script], cwd=tmp, capture_output=True, text=True, check=True)
+                report = json.loads(out.stdout.strip().splitlines()[-1])
+                paints.append(report["paint"] * 1000)
+            print(f"{label:<14}{statistics.median(paints):>14.0f}ms{percentile(paints, 99):>8.0f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LexIQ micro-benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("progress", help="progress writes per session: save-per-rerun vs write-behind")
+    p.add_argument("--sessions", type=int, default=50)
+    p.add_argument("--reruns", type=int, default=200)
+    p.add_argument("--interval", type=float, default=2.0)
+    p.add_argument("--think-time", type=float, default=0.0,
+                   help="seconds between reruns (lets the debounce timer fire mid-session)")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_progress)
+
+    p = sub.add_parser("exec", help="p50/p99 code execution latency: fresh process vs warm pool")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--runs", type=int, default=200)
+    p.add_argument("--clients", type=int, default=8)
+    p.add_argument("--max-runs", type=int, default=runner.MAX_RUNS_PER_WORKER)
+    p.set_defaults(func=bench_exec)
+
+    p = sub.add_parser("leaderboard", help="rank, award and top-K latency at a given number of users")
+    p.add_argument("--users", type=int, default=100_000)
+    p.add_argument("--queries", type=int, default=10_000)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_leaderboard)
+
+    p = sub.add_parser("insights", help="analytics job over synthetic users, by number of workers")
+    p.add_argument("--users", type=int, default=100_000)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_insights)
+
+    p = sub.add_parser("metrics", help="cost of the timers and counters on the rerun path")
+    p.add_argument("--runs", type=int, default=100_000)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("fragments", help="server time per interaction: full script rerun vs fragment rerun")
+    p.add_argument("--runs", type=int, default=50)
+    p.add_argument("--warmup", type=int, default=5)
+    p.set_defaults(func=bench_fragments)
+
+    p = sub.add_parser("coldstart", help="time to first paint of the login page in a fresh process")
+    p.add_argument("--runs", type=int, default=10)
+    p.set_defaults(func=bench_coldstart)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import ast
+import difflib
+import os
+import re
+
+CONTEXT_TOKENS = int(os.environ.get("LEXIQ_CONTEXT_TOKENS", "3000"))
+MAX_GROUP_LINES = 20
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def count_tokens(text):
+    """Rough token count: words and punctuation marks each count as one.
+
+    Close enough to the Llama tokenizer for budgeting without pulling in a
+    tokenizer dependency; it errs on the high side for prose.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def _first_sentence(text, limit=120):
+    text = " ".join(text.split())
+    match = re.search(r"[.!?](\s|$)", text)
+    if match:
+        text = text[:match.end()].strip()
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+# --- CODE REGIONS ---
+def split_regions(code):
+    """Split code into (start, end) line ranges (1-based, inclusive).
+
+    Each top-level def/class is its own region and runs of other top-level
+    statements are grouped together, up to MAX_GROUP_LINES at a time. Code that does not parse is split on
+    blank lines instead.
+    """
+    lines = code.split("\n")
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        regions, start = [], None
+        for number, line in enumerate(lines, 1):
+            if line.strip() and start is None:
+                start = number
+            elif not line.strip() and start is not None:
+                regions.append((start, number - 1))
+                start = None
+        if start is not None:
+            regions.append((start, len(lines)))
+        return regions
+
+    regions = []
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+        end = node.end_lineno
+        standalone = isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        if regions and not standalone and not regions[-1][2] and end - regions[-1][0] < MAX_GROUP_LINES:
+            regions[-1] = (regions[-1][0], end, False)
+        else:
+            regions.append((start, end, standalone))
+    return [(start, end) for start, end, _ in regions]
+
+
+def fit_code(code, budget, query=""):
+    """Return `code` cut down to roughly `budget` tokens.
+
+    When the whole file does not fit, regions sharing identifiers with
+    `query` (usually the latest student message) are kept first, then the
+    most recently written ones; skipped regions become a one-line marker.
+    """
+    if count_tokens(code) <= budget:
+        return code
+    lines = code.split("\n")
+    regions = split_regions(code)
+    if not regions:
+        return code
+    wanted = set(_IDENT_RE.findall(query))
+    scored = []
+    for index, (start, end) in enumerate(regions):
+        text = "\n".join(lines[start - 1:end])
+        overlap = len(wanted & set(_IDENT_RE.findall(text)))
+        scored.append((overlap, index, text))
+
+    keep, used = set(), 0
+    for _, index, text in sorted(scored, reverse=True):
+        cost = count_tokens(text)
+        if used + cost <= budget:
+            keep.add(index)
+            used += cost
+
+    out, skipped = [], 0
+    for index, (start, end) in enumerate(regions):
+        if index in keep:
+            if skipped:
+                out.append(f"# ... ({skipped} lines not shown)")
+                skipped = 0
+            out.append("\n".join(lines[start - 1:end]))
+        else:
+            skipped += end - start + 1
+    if skipped:
+        out.append(f"# ... ({skipped} lines not shown)")
+    return "\n".join(out)
+
+
+# --- CODE SYNC ---
+def _lines(text):
+    return (text if text.endswith("\n") else text + "\n").splitlines(True)
+
+
+def last_seen_code(history):
+    """The code version the model last saw in this conversation, if any."""
+    for message in reversed(history):
+        if 'code_version' in message:
+            return message['code_version']
+    return None
+
+
+def code_update(history, code):
+    """(kind, body) bringing the model from the code it last saw to `code`.
+
+    `kind` is "diff" when a unified diff is shorter than the file itself,
+    "full" for a complete snapshot and None when nothing changed.
+    """
+    seen = last_seen_code(history)
+    if seen == code or (seen is None and not code.strip()):
+        return None, ""
+    if seen is not None:
+        diff = "".join(difflib.unified_diff(
+            _lines(seen), _lines(code), "before", "after", n=1
+        ))
+        if len(diff) < len(code):
+            return "diff", f"```diff\n{diff}```"
+    return "full", f"```python\n{code}\n```"
+
+
+def sync_message(history, code, intro=None):
+    """A user message that tells the model about changes to `code`.
+
+    Without `intro` the message is a hidden bookkeeping turn (None if the
+    code is unchanged); with one it is a visible message from the student
+    that carries the code update along. The full code is stored on the
+    message as `code_version` so the next update can be diffed against it.
+    """
+    kind, body = code_update(history, code)
+    hidden = intro is None
+    if hidden:
+        if kind is None:
+            return None
+        intro = "My code now:" if kind == "full" else "I edited my code since you last saw it:"
+    elif kind is None:
+        body = "(No changes since you last saw it.)"
+    return {
+        "role": "user",
+        "content": f"{intro}\n{body}",
+        "intro": intro,
+        "code_sync": kind,
+        "code_version": code,
+        "hidden": hidden,
+    }
+
+
+# --- CONTEXT BUILDER ---
+class Context:
+    def __init__(self, messages, tokens):
+        self.messages = messages
+        self.tokens = tokens
+
+
+class ContextBuilder:
+    """Fits a conversation into a fixed token budget.
+
+    Code reaches the model through `sync_message` turns: full snapshots are
+    trimmed to `code_share` of the budget, diffs are sent as-is. The newest
+    turns are kept verbatim; older ones are evicted and replaced by a short
+    extractive summary. Whenever no full snapshot survives, the remaining
+    hidden diffs are dropped and a fresh snapshot of `code` goes first, so
+    the model always sees the current code.
+    """
+
+    def __init__(self, budget=CONTEXT_TOKENS, code_share=0.4, summary_tokens=150):
+        self.budget = budget
+        self.code_share = code_share
+        self.summary_tokens = summary_tokens
+
+    def _render(self, message, query):
+        if message.get('code_sync') == 'full':
+            code = fit_code(message['code_version'], int(self.budget * self.code_share), query)
+            return f"{message['intro']}\n```python\n{code}\n```"
+        return message["content"]
+
+    def build(self, history, code="", query=None):
+        if query is None:
+            query = next((m["content"] for m in reversed(history)
+                          if m["role"] == "user" and not m.get("hidden")), "")
+
+        kept, used = [], 0
+        for message in reversed(history):
+            content = self._render(message, query)
+            cost = count_tokens(content)
+            # Always keep the latest message, however long it is
+            if kept and used + cost > self.budget - self.summary_tokens:
+                break
+            kept.append((message, content, cost))
+            used += cost
+        kept.reverse()
+
+        if code.strip() and not any(message.get('code_sync') == 'full' for message, _, _ in kept):
+            # Full resync: the snapshot was evicted (with any diffs now lacking their base),
+            # and the code may not have changed since, so no later turn would carry it
+            kept = [entry for entry in kept if not (entry[0].get('hidden') and entry[0].get('code_sync'))]
+            resync = {"intro": "My code now:", "code_sync": "full", "code_version": code}
+            content = self._render(resync, query)
+            cost = count_tokens(content)
+            used = sum(entry[2] for entry in kept)
+            # Make room for it by evicting more of the oldest turns
+            while len(kept) > 1 and used + cost > self.budget - self.summary_tokens:
+                used -= kept.pop(0)[2]
+            kept.insert(0, (resync, content, cost))
+            used += cost
+
+        kept_ids = {id(message) for message, _, _ in kept}
+        evicted = [m for m in history if id(m) not in kept_ids and not m.get("hidden")]
+
+        messages = [{"role": message.get("role", "user"), "content": content} for message, content, _ in kept]
+        if evicted:
+            summary = self.summarize(evicted)
+            messages.insert(0, {"role": "system", "content": summary})
+            used += count_tokens(summary)
+        return Context(messages, used)
+
+    def summarize(self, messages):
+        lines, used = [], 0
+        for message in reversed(messages):
+            who = "Student" if message["role"] == "user" else "Tutor"
+            line = f"- {who}: {_first_sentence(message['content'])}"
+            cost = count_tokens(line)
+            if used + cost > self.summary_tokens:
+                break
+            lines.append(line)
+            used += cost
+        lines.reverse()
+        return "Summary of earlier conversation (older turns omitted):\n" + "\n".join(lines)
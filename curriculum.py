@@ -0,0 +1,134 @@
+import functools
+import json
+import os
+import sys
+
+CONTENT_DIR = os.environ.get("LEXIQ_CONTENT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content"))
+MANIFEST_FORMAT = 1
+LESSON_CACHE_SIZE = int(os.environ.get("LEXIQ_LESSON_CACHE", "256"))
+# Lesson fields copied into the manifest; everything else is loaded on demand
+SUMMARY_FIELDS = ("id", "title", "description")
+
+
+# --- BUILDING THE MANIFEST ---
+def build_manifest(content_dir=CONTENT_DIR):
+    """Index every track pack under content_dir/tracks.
+
+    A pack is a directory with a track.json ({"name", "order", "lessons":
+    [ids]}) and one <lesson id>.json per lesson.
+    """
+    tracks_dir = os.path.join(content_dir, "tracks")
+    tracks = []
+    for slug in sorted(os.listdir(tracks_dir)):
+        track_path = os.path.join(tracks_dir, slug, "track.json")
+        if not os.path.exists(track_path):
+            continue
+        with open(track_path, 'r') as f:
+            track = json.load(f)
+        lessons = []
+        for lesson_id in track["lessons"]:
+            path = os.path.join("tracks", slug, f"{lesson_id}.json")
+            with open(os.path.join(content_dir, path), 'r') as f:
+                lesson = json.load(f)
+            summary = {field: lesson[field] for field in SUMMARY_FIELDS}
+            summary["path"] = path
+            lessons.append(summary)
+        tracks.append({"name": track["name"], "order": track.get("order", 0), "lessons": lessons})
+    tracks.sort(key=lambda track: (track["order"], track["name"]))
+    return {"format": MANIFEST_FORMAT, "tracks": tracks, "projects": "projects.json"}
+
+
+def write_manifest(content_dir=CONTENT_DIR):
+    manifest = build_manifest(content_dir)
+    with open(os.path.join(content_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return manifest
+
+
+# --- LOADING ---
+def load_manifest(content_dir=CONTENT_DIR):
+    try:
+        with open(os.path.join(content_dir, "manifest.json"), 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return build_manifest(content_dir)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        return build_manifest(content_dir)
+    return manifest
+
+
+MANIFEST = load_manifest()
+
+# Track name -> {"lessons": [lesson summaries]}; full lessons come from get_lesson()
+CURRICULUM = {track["name"]: {"lessons": track["lessons"]} for track in MANIFEST["tracks"]}
+
+
+# --- INDEX ---
+class CurriculumIndex:
+    """Lookups over the manifest, built once per process.
+
+    Completion checks take a set of completed ids, so they cost O(1) per
+    lesson instead of scanning the stored list; ids that are not lessons
+    (such as project_* entries) are simply ignored.
+    """
+
+    def __init__(self, manifest):
+        self.lessons = {}
+        self.position = {}
+        self.track_lessons = {}
+        for track_number, track in enumerate(manifest["tracks"]):
+            ids = frozenset(lesson["id"] for lesson in track["lessons"])
+            self.track_lessons[track["name"]] = ids
+            for lesson_number, lesson in enumerate(track["lessons"]):
+                self.lessons[lesson["id"]] = lesson
+                self.position[lesson["id"]] = (track_number, lesson_number)
+        self.lesson_ids = frozenset(self.lessons)
+        self.track_counts = {name: len(ids) for name, ids in self.track_lessons.items()}
+        self.total = len(self.lessons)
+
+    def completed_count(self, completed):
+        return len(self.lesson_ids & completed)
+
+    def completed_in_track(self, track_name, completed):
+        return len(self.track_lessons[track_name] & completed)
+
+    def completed_tracks(self, completed):
+        return [name for name, ids in self.track_lessons.items() if ids and ids <= completed]
+
+
+INDEX = CurriculumIndex(MANIFEST)
+
+
+@functools.lru_cache(maxsize=LESSON_CACHE_SIZE)
+def get_lesson(lesson_id):
+    """Full lesson (content, exercise, solution, tests, quiz), shared by every session."""
+    summary = INDEX.lessons.get(lesson_id)
+    if summary is None:
+        return None
+    with open(os.path.join(CONTENT_DIR, summary["path"]), 'r') as f:
+        return json.load(f)
+
+
+def iter_lessons():
+    for track in MANIFEST["tracks"]:
+        for summary in track["lessons"]:
+            yield get_lesson(summary["id"])
+
+
+# --- PROJECTS ---
+def _load_projects():
+    with open(os.path.join(CONTENT_DIR, MANIFEST["projects"]), 'r') as f:
+        return json.load(f)
+
+
+PROJECTS = _load_projects()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build-index":
+        print("usage: python curriculum.py build-index [content_dir]")
+        sys.exit(1)
+    manifest = write_manifest(sys.argv[2] if len(sys.argv) > 2 else CONTENT_DIR)
+    lessons = sum(len(track["lessons"]) for track in manifest["tracks"])
+    print(f"Indexed {len(manifest['tracks'])} tracks and {lessons} lessons")
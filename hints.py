@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from curriculum import CONTENT_DIR, PROJECTS, get_lesson, iter_lessons
+
+# Lives with the content it was generated from, wherever the app is started
+BANK_PATH = os.environ.get("LEXIQ_HINT_BANK", os.path.join(CONTENT_DIR, "hint_bank.json"))
+BANK_FORMAT = 1
+DEFAULT_LEVELS = 3
+
+HINT_SYSTEM_PROMPT = (
+    "You are LexIQ, a Socratic coding tutor writing a ladder of hints for a beginner Python exercise.\n"
+    "Write exactly {levels} hints, from most vague to most specific.\n"
+    "- HINT 1 only points at the concept to think about, as a question.\n"
+    "- Each next hint narrows it down a little more.\n"
+    "- HINT {levels} may show a tiny pattern or pseudocode, never the full solution.\n"
+    "Reply with one line per hint, formatted exactly as:\n"
+    "HINT 1: ...\n"
+    "HINT 2: ...\n"
+)
+
+
+# --- ITEMS ---
+def source_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def lesson_task(lesson):
+    return f"Lesson: {lesson['title']}\nExercise: {lesson['exercise']}"
+
+
+def project_task(project):
+    return (
+        f"Project: {project['title']}\nGoal: {project['description']}\n"
+        f"Skills: {', '.join(project['skills'])}\n"
+        "The student has only just started and is stuck on the first step."
+    )
+
+
+def hint_items():
+    """(item_id, task text) for every lesson exercise and project starter."""
+    for lesson in iter_lessons():
+        yield f"lesson:{lesson['id']}", lesson_task(lesson)
+    for project in PROJECTS:
+        yield f"project:{project['id']}", project_task(project)
+
+
+def item_source(item_id):
+    """Current task text for one item, loading only that lesson."""
+    kind, _, key = item_id.partition(":")
+    if kind == "lesson":
+        lesson = get_lesson(key)
+        return lesson_task(lesson) if lesson else None
+    if kind == "project":
+        project = next((p for p in PROJECTS if p['id'] == key), None)
+        return project_task(project) if project else None
+    return None
+
+
+def parse_hints(text, levels):
+    found = {}
+    for match in re.finditer(r"^\s*HINT\s*(\d+)\s*[:.-]\s*(.+)$", text, re.MULTILINE):
+        found.setdefault(int(match.group(1)), match.group(2).strip())
+    return [found[level] for level in range(1, levels + 1) if level in found]
+
+
+# --- MODELS ---
+class StubModel:
+    """Deterministic offline stand-in for the LLM, for tests and dry runs."""
+
+    name = "stub"
+
+    def complete(self, messages, temperature=None):
+        task = messages[-1]["content"].split("\n")[1]
+        levels = int(re.search(r"exactly (\d+) hints", messages[0]["content"]).group(1))
+        return "\n".join(f"HINT {level}: ({level}/{levels}) Think about: {task}" for level in range(1, levels + 1))
+
+
+class GroqModel:
+    def __init__(self, api_key, model="llama-3.1-8b-instant"):
+        import llm
+        self.name = model
+        self.client = llm.ClientPool().get(api_key)
+        self._stream_chat = llm.stream_chat
+
+    def complete(self, messages, temperature=0.3):
+        return "".join(self._stream_chat(self.client, model=self.name, messages=messages, temperature=temperature))
+
+
+# --- BANK ---
+def generate_ladder(model, item_id, task, levels):
+    messages = [
+        {"role": "system", "content": HINT_SYSTEM_PROMPT.format(levels=levels)},
+        {"role": "user", "content": task},
+    ]
+    hints = parse_hints(model.complete(messages, temperature=0.3), levels)
+    return item_id, {"source_hash": source_hash(task), "hints": hints}
+
+
+def build_bank(model, levels=DEFAULT_LEVELS, workers=8):
+    items = list(hint_items())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ladders = dict(pool.map(lambda item: generate_ladder(model, item[0], item[1], levels), items))
+    return {
+        "format": BANK_FORMAT,
+        "model": model.name,
+        "levels": levels,
+        "generated_at": datetime.now().isoformat(),
+        "items": ladders,
+    }
+
+
+def save_bank(bank, path=BANK_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(bank, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class HintBank:
+    """Pre-generated hint ladders, looked up by lesson or project id.
+
+    A ladder is only served while its `source_hash` still matches the
+    current exercise text, so editing a lesson never shows stale hints.
+    """
+
+    def __init__(self, bank=None):
+        self.bank = bank or {"items": {}}
+        self._fresh = {}
+
+    @classmethod
+    def load(cls, path=BANK_PATH):
+        try:
+            with open(path, 'r') as f:
+                bank = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls()
+        if bank.get("format") != BANK_FORMAT:
+            return cls()
+        return cls(bank)
+
+    def ladder(self, item_id):
+        entry = self.bank["items"].get(item_id)
+        if entry is None:
+            return []
+        if item_id not in self._fresh:
+            source = item_source(item_id)
+            self._fresh[item_id] = source is not None and entry["source_hash"] == source_hash(source)
+        return entry["hints"] if self._fresh[item_id] else []
+
+    def hint(self, item_id, level):
+        """The 1-based `level` hint for an item, or None past the end of its ladder."""
+        ladder = self.ladder(item_id)
+        return ladder[level - 1] if 0 < level <= len(ladder) else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline hint bank for lessons and projects")
+    parser.add_argument("--model", choices=["stub", "groq"], default="groq")
+    parser.add_argument("--groq-model", default="llama-3.1-8b-instant")
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--out", default=BANK_PATH)
+    args = parser.parse_args(argv)
+
+    if args.model == "stub":
+        model = StubModel()
+    else:
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            parser.error("set GROQ_API_KEY or use --model stub")
+        model = GroqModel(api_key, args.groq_model)
+
+    bank = build_bank(model, args.levels, args.workers)
+    save_bank(bank, args.out)
+    short = [item for item, entry in bank["items"].items() if len(entry["hints"]) < args.levels]
+    print(f"Wrote {len(bank['items'])} hint ladders to {args.out}")
+    if short:
+        print(f"Incomplete ladders: {', '.join(short)}")
+    return 1 if short else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import argparse
+import array
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import storage
+from curriculum import CURRICULUM, iter_lessons
+
+DEFAULT_PATH = os.environ.get("LEXIQ_INSIGHTS", "lexiq-insights.npz")
+POINTS_BIN = 50
+# More shards than workers so one slow shard doesn't leave the others idle
+SHARDS_PER_WORKER = 4
+
+
+# --- CURRICULUM LAYOUT ---
+def layout():
+    """Lessons in course order and every quiz question, as the columns are laid out."""
+    track_names = list(CURRICULUM)
+    lessons, lesson_track, titles = [], [], []
+    for track_number, name in enumerate(track_names):
+        for summary in CURRICULUM[name]["lessons"]:
+            lessons.append(summary["id"])
+            lesson_track.append(track_number)
+            titles.append(summary["title"])
+    lesson_number = {lesson_id: i for i, lesson_id in enumerate(lessons)}
+    questions, question_lesson, question_text = [], [], []
+    for lesson in iter_lessons():
+        for number, question in enumerate(lesson.get("quiz", [])):
+            questions.append((lesson["id"], str(number)))
+            question_lesson.append(lesson_number[lesson["id"]])
+            question_text.append(question["question"])
+    return {
+        "track_names": np.array(track_names, dtype=str),
+        "lesson_ids": np.array(lessons, dtype=str),
+        "lesson_titles": np.array(titles, dtype=str),
+        "lesson_track": np.array(lesson_track, dtype=np.int32),
+        "question_lesson": np.array(question_lesson, dtype=np.int32),
+        "question_number": np.array([int(number) for _, number in questions], dtype=np.int32),
+        "question_text": np.array(question_text, dtype=str),
+    }, lesson_number, {key: i for i, key in enumerate(questions)}
+
+
+# --- SCAN ---
+def scan_shard(job):
+    """Aggregate one username range; runs in a pool worker with its own connection."""
+    backend, location, start, stop, lesson_number, question_number = job
+    store = storage.open_storage(backend, location)
+    completions = np.zeros(len(lesson_number), dtype=np.int64)
+    attempts = np.zeros(len(question_number), dtype=np.int64)
+    correct = np.zeros(len(question_number), dtype=np.int64)
+    points = array.array('q')
+    try:
+        for _, progress, snapshot, events in store.iter_progress(start, stop):
+            progress = progress or {}
+            state = storage.replay_state(progress, snapshot, events)
+            points.append(state['total_points'])
+            for lesson_id in set(state['completed_lessons']):
+                if lesson_id in lesson_number:
+                    completions[lesson_number[lesson_id]] += 1
+            for lesson_id, scores in progress.get('quiz_scores', {}).items():
+                for number, (tries, right) in scores.items():
+                    index = question_number.get((lesson_id, number))
+                    if index is not None:
+                        attempts[index] += tries
+                        correct[index] += right
+    finally:
+        store.close()
+    points = np.maximum(np.frombuffer(points, dtype=np.int64), 0)
+    return {
+        "users": len(points),
+        "completions": completions,
+        "attempts": attempts,
+        "correct": correct,
+        "points_counts": np.bincount(points // POINTS_BIN) if len(points) else np.zeros(0, dtype=np.int64),
+    }
+
+
+def _merge(total, part):
+    total["users"] += part["users"]
+    for key in ("completions", "attempts", "correct"):
+        total[key] += part[key]
+    a, b = total["points_counts"], part["points_counts"]
+    if len(b) > len(a):
+        a, b = b, a
+    a = a.copy()
+    a[:len(b)] += b
+    total["points_counts"] = a
+
+
+def build(backend=storage.DEFAULT_BACKEND, location=None, workers=None):
+    """Stream every user's progress through a process pool into columnar aggregates.
+
+    Accounts are split into username ranges. Each worker scans a range
+    with its own connection and keeps only per-lesson and per-question
+    counters plus one points column for that range, so memory stays flat
+    however many users there are.
+    """
+    columns, lesson_number, question_number = layout()
+    workers = workers or os.cpu_count() or 1
+    store = storage.open_storage(backend, location)
+    try:
+        ranges = store.user_ranges(workers * SHARDS_PER_WORKER)
+    finally:
+        store.close()
+    jobs = [(backend, location, start, stop, lesson_number, question_number) for start, stop in ranges]
+    total = {
+        "users": 0,
+        "completions": np.zeros(len(lesson_number), dtype=np.int64),
+        "attempts": np.zeros(len(question_number), dtype=np.int64),
+        "correct": np.zeros(len(question_number), dtype=np.int64),
+        "points_counts": np.zeros(0, dtype=np.int64),
+    }
+    if workers == 1:
+        for part in map(scan_shard, jobs):
+            _merge(total, part)
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for part in pool.imap_unordered(scan_shard, jobs):
+                _merge(total, part)
+    columns.update(total)
+    columns["users"] = np.int64(total["users"])
+    columns["points_bin"] = np.int64(POINTS_BIN)
+    columns["generated_at"] = np.float64(time.time())
+    return Insights(columns)
+
+
+# --- RESULTS ---
+class Insights:
+    """Aggregates for the Instructor page, one NumPy array per column."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __getattr__(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def save(self, path=DEFAULT_PATH):
+        # Written beside the target and renamed, so readers never see half a file
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as f:
+            np.savez_compressed(f, **self.columns)
+        os.replace(f.name, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def funnel(self):
+        """(track, lesson title, users completed, share of users) in course order."""
+        users = max(int(self.users), 1)
+        return [
+            (str(self.track_names[track]), str(title), int(count), float(count / users))
+            for track, title, count in zip(self.lesson_track, self.lesson_titles, self.completions)
+        ]
+
+    def question_accuracy(self):
+        """(lesson title, question, attempts, accuracy) for answered questions, hardest first."""
+        answered = np.flatnonzero(self.attempts)
+        accuracy = self.correct[answered] / self.attempts[answered]
+        return [
+            (str(self.lesson_titles[self.question_lesson[i]]), str(self.question_text[i]),
+             int(self.attempts[i]), float(share))
+            for i, share in sorted(zip(answered, accuracy), key=lambda item: item[1])
+        ]
+
+    def points_distribution(self):
+        """(lowest points, highest points, users) per bin, empty bins dropped."""
+        width = int(self.points_bin)
+        return [
+            (i * width, (i + 1) * width - 1, int(count))
+            for i, count in enumerate(self.points_counts) if count
+        ]
+
+    def points_percentile(self, pct):
+        """Lower edge of the points bin holding the `pct`th percentile user."""
+        cumulative = np.cumsum(self.points_counts)
+        if not len(cumulative) or cumulative[-1] == 0:
+            return 0
+        return int(np.searchsorted(cumulative, cumulative[-1] * pct / 100)) * int(self.points_bin)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Instructor page's aggregates from every user's progress")
+    parser.add_argument("--backend", default=storage.DEFAULT_BACKEND, choices=("sqlite", "json"))
+    parser.add_argument("--location", default=None, help="database path, or directory for the json backend")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    insights = build(args.backend, args.location, args.workers)
+    insights.save(args.out)
+    print(f"{int(insights.users)} users with {args.workers} workers in {time.perf_counter() - start:.1f}s "
+          f"-> {args.out} ({os.path.getsize(args.out)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
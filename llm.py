@@ -0,0 +1,432 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+import metrics
+
+MAX_CLIENTS = int(os.environ.get("LEXIQ_MAX_CLIENTS", "64"))
+CLIENT_IDLE_TIMEOUT = float(os.environ.get("LEXIQ_CLIENT_IDLE_TIMEOUT", "900"))
+MAX_CONNECTIONS = int(os.environ.get("LEXIQ_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.environ.get("LEXIQ_MAX_KEEPALIVE", "10"))
+MAX_CONCURRENCY = int(os.environ.get("LEXIQ_LLM_CONCURRENCY", "8"))
+PER_KEY_CONCURRENCY = int(os.environ.get("LEXIQ_LLM_PER_KEY_CONCURRENCY", "3"))
+MAX_RETRIES = int(os.environ.get("LEXIQ_LLM_RETRIES", "4"))
+CACHE_PATH = os.environ.get("LEXIQ_LLM_CACHE", "llm_cache.db")
+CACHE_MEMORY_ENTRIES = int(os.environ.get("LEXIQ_LLM_CACHE_ENTRIES", "512"))
+CACHE_TTL = float(os.environ.get("LEXIQ_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.environ.get("LEXIQ_LLM_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+# --- CLIENT POOL ---
+def load_sdk():
+    """Import the Groq SDK and httpx on first use.
+
+    Together they take longer to import than the rest of the app, so
+    pages that never talk to the model (the login page in particular)
+    should not pay for them.
+    """
+    import httpx
+    from groq import Groq
+    return Groq, httpx
+
+
+def key_id(api_key):
+    """Stable identifier for an API key that never keeps the key itself around."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class ClientPool:
+    """Process-wide Groq clients, one per API key, reused across reruns.
+
+    Reusing a client keeps its HTTP connections (and TLS sessions) alive
+    between messages. Clients unused for `idle_timeout` seconds are closed,
+    and the least recently used one is dropped once `max_clients` is hit.
+    """
+
+    def __init__(self, max_clients=MAX_CLIENTS, idle_timeout=CLIENT_IDLE_TIMEOUT,
+                 max_connections=MAX_CONNECTIONS, max_keepalive=MAX_KEEPALIVE):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.limits = None
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Import the SDK and build the connection limits ahead of the first client."""
+        _, httpx = load_sdk()
+        if self.limits is None:
+            self.limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.idle_timeout,
+            )
+        return self
+
+    def _create(self, api_key):
+        Groq, httpx = load_sdk()
+        self.warm()
+        # Retries are handled by the Dispatcher so they can be spread out fairly
+        return Groq(api_key=api_key, max_retries=0, http_client=httpx.Client(limits=self.limits))
+
+    def get(self, api_key):
+        key = key_id(api_key)
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict(now)
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = [self._create(api_key), now]
+                self._clients[key] = entry
+                while len(self._clients) > self.max_clients:
+                    evicted.append(self._clients.popitem(last=False)[1][0])
+            else:
+                entry[1] = now
+                self._clients.move_to_end(key)
+        for client in evicted:
+            client.close()
+        return entry[0]
+
+    def _evict(self, now):
+        stale = [key for key, (_, used) in self._clients.items() if now - used > self.idle_timeout]
+        return [self._clients.pop(key)[0] for key in stale]
+
+    def __len__(self):
+        return len(self._clients)
+
+    def close(self):
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+# --- GROQ CHAT HELPERS ---
+def status_code(error):
+    code = getattr(error, 'status_code', None)
+    if code is None and getattr(error, 'response', None) is not None:
+        code = getattr(error.response, 'status_code', None)
+    return code
+
+
+def is_retryable(error):
+    code = status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    # Connection resets and timeouts carry no status code; an httpx error
+    # can only exist if something already imported httpx
+    httpx = sys.modules.get('httpx')
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError)) or \
+        type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+
+def retry_after(error):
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def describe_error(error):
+    if status_code(error) == 429:
+        return "⏳ The AI is getting a lot of questions right now. Please try again in a few seconds."
+    return f"Error: {error}"
+
+
+def stream_chat(client, usage=None, **kwargs):
+    """Yield the text of a streamed chat completion as it arrives.
+
+    Meant to be handed straight to `st.write_stream`, which renders each
+    piece as it comes in and returns the full text once the stream ends.
+    Token counts reported with the stream are copied into `usage`.
+    """
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    for chunk in stream:
+        # Groq puts usage on the last chunk under x_groq; OpenAI-style servers use chunk.usage
+        reported = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or getattr(chunk, 'usage', None)
+        if reported is not None and usage is not None:
+            usage['prompt_tokens'] = getattr(reported, 'prompt_tokens', None)
+            usage['completion_tokens'] = getattr(reported, 'completion_tokens', None)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def record_call(site, outcome, latency=None, waited=None, first_token=None, usage=None):
+    """Count one completion for `site` and, if it finished, add it to the histograms."""
+    registry = metrics.REGISTRY
+    registry.counter("llm.requests", site=site, outcome=outcome).inc()
+    if outcome != "ok":
+        return
+    registry.histogram("llm.latency_seconds", metrics.LATENCY_BUCKETS, site=site).observe(latency)
+    registry.histogram("llm.queue_wait_seconds", metrics.LATENCY_BUCKETS, site=site).observe(waited)
+    if first_token is not None:
+        registry.histogram("llm.first_token_seconds", metrics.LATENCY_BUCKETS, site=site).observe(first_token)
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        if usage.get(kind) is not None:
+            registry.histogram(f"llm.{kind}", metrics.TOKEN_BUCKETS, site=site).observe(usage[kind])
+
+
+# --- RESPONSE CACHE ---
+def normalize_text(text):
+    lines = text.replace("\r\n", "\n").strip().split("\n")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def cache_key(model, messages, temperature=None):
+    normalized = [[m["role"], normalize_text(m["content"])] for m in messages]
+    payload = json.dumps([model, normalized, temperature], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache of finished responses for repeatable prompts.
+
+    Lookups hit an in-memory LRU first, then an SQLite file shared by every
+    process. Disk entries expire after `ttl` seconds and the oldest-used
+    ones are dropped once the file holds more than `max_bytes` of text.
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_entries=CACHE_MEMORY_ENTRIES, ttl=CACHE_TTL,
+                 max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at)")
+        self._conn.commit()
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[0]
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                self._conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self._remember(key, row[0], row[1])
+                self.stats['disk_hits'] += 1
+                return row[0]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode()), now, now)
+            )
+            self._prune(now)
+            self._conn.commit()
+            self.stats['writes'] += 1
+
+    def _prune(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY used_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
+
+
+# --- DISPATCHER ---
+_DONE = object()
+
+
+class _Job:
+    def __init__(self, user, api_key, kwargs):
+        self.user = user
+        self.api_key = api_key
+        self.key = key_id(api_key)
+        self.kwargs = kwargs
+        self.output = queue.Queue()
+        self.cancelled = False
+        self.usage = {}
+        self.queued = time.perf_counter()
+        self.started = None
+
+
+class Dispatcher:
+    """Runs every chat completion on a bounded pool of worker threads.
+
+    At most `max_concurrency` requests are in flight overall and at most
+    `per_key_concurrency` per API key. Waiting requests are queued per user
+    and served round-robin, so one chatty student cannot starve the rest.
+    429s, 5xx and connection errors are retried with jittered exponential
+    backoff as long as nothing has been streamed to the caller yet.
+    """
+
+    def __init__(self, clients, max_concurrency=MAX_CONCURRENCY, per_key_concurrency=PER_KEY_CONCURRENCY,
+                 max_retries=MAX_RETRIES, base_delay=0.5, max_delay=20.0, cache=None):
+        self.clients = clients
+        self.cache = cache
+        self.per_key_concurrency = per_key_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queues = OrderedDict()
+        self._active_keys = Counter()
+        self._cond = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"llm-worker-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def stream(self, user, api_key, cache=False, site="other", **kwargs):
+        """Queue a streamed completion and yield its text as it arrives.
+
+        With `cache=True` an identical earlier request is answered from the
+        response cache without touching the queue. Only requests at
+        temperature 0 are cached: a sampled reply is one of many, and
+        replaying it would hand every student the same one. `site` names
+        the caller in the latency and token metrics.
+        """
+        key = None
+        if cache and self.cache is not None and kwargs.get('temperature') == 0:
+            key = cache_key(kwargs.get('model'), kwargs.get('messages', []), kwargs.get('temperature'))
+            cached = self.cache.get(key)
+            if cached is not None:
+                record_call(site, "cached")
+                yield cached
+                return
+        job = _Job(user, api_key, kwargs)
+        with self._cond:
+            self._queues.setdefault(user, deque()).append(job)
+            self._cond.notify()
+        pieces = []
+        first_token = None
+        done = False
+        try:
+            while True:
+                item = job.output.get()
+                if item is _DONE:
+                    done = True
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                if first_token is None:
+                    first_token = time.perf_counter() - job.queued
+                pieces.append(item)
+                yield item
+        finally:
+            # The script may be interrupted by a rerun mid-stream
+            job.cancelled = True
+            if done:
+                if job.usage.get('completion_tokens') is None:
+                    # Without reported usage, each streamed piece is about one token
+                    job.usage['completion_tokens'] = len(pieces)
+                record_call(site, "ok", time.perf_counter() - job.queued, job.started - job.queued,
+                            first_token, job.usage)
+            else:
+                record_call(site, "failed")
+        if key is not None and pieces:
+            self.cache.put(key, "".join(pieces))
+
+    def complete(self, user, api_key, cache=False, site="other", **kwargs):
+        return "".join(self.stream(user, api_key, cache=cache, site=site, **kwargs))
+
+    def pending(self):
+        with self._cond:
+            return sum(len(jobs) for jobs in self._queues.values())
+
+    def _next_job(self):
+        for user, jobs in self._queues.items():
+            job = jobs[0]
+            if self._active_keys[job.key] < self.per_key_concurrency:
+                jobs.popleft()
+                # Rotate this user to the back so the others go first next time
+                self._queues.move_to_end(user)
+                if not jobs:
+                    del self._queues[user]
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._active_keys[job.key] += 1
+            job.started = time.perf_counter()
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._active_keys[job.key] -= 1
+                    self._cond.notify_all()
+
+    def _run(self, job):
+        attempt = 0
+        while True:
+            if job.cancelled:
+                return
+            streamed = False
+            try:
+                client = self.clients.get(job.api_key)
+                for text in stream_chat(client, job.usage, **job.kwargs):
+                    if job.cancelled:
+                        return
+                    streamed = True
+                    job.output.put(text)
+                job.output.put(_DONE)
+                return
+            except Exception as e:
+                if streamed or attempt >= self.max_retries or not is_retryable(e):
+                    job.output.put(e)
+                    return
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                time.sleep(delay)
@@ -1,45 +1,248 @@
+import time
+# Taken before the other imports so a cold start's login timing includes them
+script_start = time.perf_counter()
+
 import streamlit as st
-from groq import Groq
-import json
+import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import functools
 import hashlib
+import os
+import uuid
 from datetime import datetime
+import storage
+import llm
+import context
+import hints
+import runner
+import analysis
+import assets
+import metrics
+import startup
+import leaderboard
+import replies
+from curriculum import CURRICULUM, INDEX, PROJECTS, get_lesson
 
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="LexIQ - AI-Powered Coding", page_icon="🧠", layout="wide")
 
 # --- USER AUTHENTICATION FUNCTIONS ---
+@st.cache_resource
+def get_storage():
+    return storage.open_storage()
+
+@st.cache_resource
+def get_user_directory():
+    return storage.UserDirectory(get_storage())
+
+@st.cache_resource
+def get_progress_log():
+    return storage.ProgressLog(get_storage())
+
+@st.cache_resource
+def get_progress_writer():
+    return storage.ProgressWriter(get_storage())
+
+# Session keys kept in the shared store so any server process can pick them up
+SHARED_STATE_GROUPS = {
+    'assistant': ('current_code', 'pending_changes'),
+    'project': ('selected_project', 'project_code', 'project_progress', 'code_given', 'project_hints'),
+}
+# Chat session keys -> stored conversation, persisted as transcript segments
+TRANSCRIPTS = {'chat_history': 'assistant', 'project_chat': 'project'}
+CHAT_PAGE_SIZE = 20
+# Usernames that see the Instructor page
+INSTRUCTORS = {name.strip() for name in os.environ.get("LEXIQ_INSTRUCTORS", "").split(",") if name.strip()}
+# Usernames that see the Metrics page
+ADMINS = {name.strip() for name in os.environ.get("LEXIQ_ADMINS", "").split(",") if name.strip()}
+
+@st.cache_resource
+def get_shared_state():
+    return storage.SharedState(get_storage(), SHARED_STATE_GROUPS)
+
+@st.cache_resource
+def get_transcripts():
+    return storage.TranscriptStore(get_storage(), TRANSCRIPTS)
+
+@st.cache_resource
+def get_leaderboard():
+    # Built from storage once per process, then kept current from the event log
+    return leaderboard.LiveLeaderboard(get_storage())
+
+@st.cache_resource(max_entries=1)
+def get_insights(path, mtime):
+    # Keyed on the file's mtime, so a rebuilt file is picked up on the next view
+    import insights
+    return insights.Insights.load(path)
+
+@st.cache_resource
+def get_assets():
+    return assets.build()
+
+@st.cache_resource
+def get_client_pool():
+    return llm.ClientPool()
+
+@st.cache_resource
+def get_response_cache():
+    return llm.ResponseCache()
+
+@st.cache_resource
+def get_dispatcher():
+    return llm.Dispatcher(get_client_pool(), cache=get_response_cache())
+
+@st.cache_resource
+def get_context_builder():
+    return context.ContextBuilder()
+
+@st.cache_resource
+def get_hint_bank():
+    return hints.HintBank.load()
+
+@st.cache_resource
+def get_code_runner():
+    return runner.WarmPool()
+
+@st.cache_resource
+def get_metrics_exporter():
+    # Writes LEXIQ_METRICS_FILE and/or serves LEXIQ_METRICS_PORT; does nothing when neither is set
+    return metrics.Exporter().start()
+
+@st.cache_resource
+def get_warmup():
+    # Preloads in the background; the login page never waits for it. The thread gets no
+    # script context, so it is not stopped with (or drawing spinners into) the first session
+    return startup.Warmup([
+        # Only the manifest index; lesson files are read on demand by get_lesson()
+        ("curriculum", lambda: INDEX.total),
+        ("user directory", lambda: len(get_user_directory())),
+        ("client pool", lambda: get_client_pool().warm()),
+        ("leaderboard", lambda: len(get_leaderboard())),
+    ]).start()
+
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def load_users():
-    try:
-        with open('users.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+def create_user(username, password_hash):
+    return get_user_directory().create(username, password_hash)
 
-def save_users(users):
-    with open('users.json', 'w') as f:
-        json.dump(users, f, indent=2)
+def check_credentials(username, password):
+    stored = get_user_directory().get(username)
+    return stored is not None and stored == hash_password(password)
 
 def load_user_progress(username):
-    try:
-        with open(f'progress_{username}.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {
-            'completed_lessons': [],
-            'quiz_scores': {},
-            'code_submissions': [],
-            'current_streak': 0,
-            'total_points': 0,
-            'last_login': datetime.now().isoformat()
-        }
-
-def save_user_progress(username, progress):
-    progress['last_login'] = datetime.now().isoformat()
-    with open(f'progress_{username}.json', 'w') as f:
-        json.dump(progress, f, indent=2)
+    # Fields missing from storage (a new account, or a field added since) start at their defaults
+    stored = get_storage().load_progress(username) or {}
+    progress = storage.default_progress()
+    progress.update(stored)
+    # Only what was actually stored counts as saved, so the first mark writes the defaults
+    get_progress_writer().track(username, stored, st.session_state.session_id)
+    return get_progress_log().load(username, progress)
+
+def award_points(kind, amount, ref=None):
+    # Recorded as an event; the session copy is updated the same way replay would
+    storage.apply_event(st.session_state.user_progress, kind, amount, ref)
+    if ref is not None:
+        st.session_state.completed.add(ref)
+    get_progress_log().record(st.session_state.username, kind, amount, ref)
+
+def record_quiz_answer(lesson_id, question, correct):
+    # quiz_scores: {lesson id: {question number: [attempts, correct]}}, read by insights.py
+    scores = st.session_state.user_progress.setdefault('quiz_scores', {})
+    tally = scores.setdefault(lesson_id, {}).setdefault(str(question), [0, 0])
+    tally[0] += 1
+    tally[1] += int(correct)
+    # Answers rerun only the quiz fragment, so queue the write here
+    get_progress_writer().mark(st.session_state.username, st.session_state.user_progress, st.session_state.session_id)
+
+def restore_shared_state(username):
+    get_shared_state().restore(username, st.session_state)
+    get_transcripts().restore(username, st.session_state)
+
+def sync_shared_state():
+    username = st.session_state.username
+    with metrics.REGISTRY.time("state.sync"):
+        replaced = get_shared_state().sync(username, st.session_state) + get_transcripts().sync(username, st.session_state)
+    if replaced:
+        st.toast("Your chat or workspace was changed in another tab, so the latest copy was loaded.")
+
+def show_transcript(key):
+    """Render the newest page of a chat; older pages are loaded on request."""
+    transcript = st.session_state[key]
+    conversation = TRANSCRIPTS[key]
+    pages = st.session_state.setdefault('transcript_pages', {})
+    visible = [i for i, message in enumerate(transcript) if not message.get("hidden")]
+    wanted = CHAT_PAGE_SIZE * pages.get(conversation, 1)
+    if len(visible) > wanted or getattr(transcript, 'start', 0) > 0:
+        if st.button("⬆️ Show older messages", key=f"older_{conversation}", use_container_width=True):
+            pages[conversation] = pages.get(conversation, 1) + 1
+            wanted += CHAT_PAGE_SIZE
+            if len(visible) < wanted and get_transcripts().load_older(st.session_state.username, conversation, transcript):
+                visible = [i for i, message in enumerate(transcript) if not message.get("hidden")]
+    shown = visible[-wanted:]
+    if isinstance(transcript, storage.Transcript):
+        # Keep what is on screen in memory when the window is trimmed
+        transcript.pinned = len(transcript) - shown[0] if shown else 0
+    for index in shown:
+        message = transcript[index]
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+def parse_reply(suggested, stream):
+    """Pass a reply stream through, queueing each code change as soon as its block closes."""
+    parser = replies.ReplyParser()
+    for piece in stream:
+        yield piece
+        for event in parser.feed(piece):
+            add_reply_event(suggested, event)
+    for event in parser.close():
+        add_reply_event(suggested, event)
+
+def add_reply_event(suggested, event):
+    if event.kind == 'code_change':
+        change = {'explanation': event.explanation, 'code': event.text}
+        if event.why:
+            change['why'] = event.why
+        st.session_state.pending_changes.append(change)
+        suggested.append(change)
+        st.toast(f"📝 Suggested change {len(suggested)} is ready")
+    elif event.kind == 'why' and event.change is not None:
+        suggested[event.change]['why'] = event.text
+
+def show_run_result(verdict):
+    for result in verdict.results:
+        st.markdown(f"{'✅' if result['passed'] else '❌'} {result['name']}")
+    if verdict.error:
+        st.error(verdict.error)
+    if verdict.output:
+        st.code(verdict.output, language='text')
+    st.caption(f"Ran in {verdict.duration * 1000:.0f} ms")
+
+def in_fragment_rerun():
+    """Whether this run reruns only fragments, rather than the whole script."""
+    ctx = get_script_run_ctx()
+    return ctx is not None and bool(ctx.fragment_ids_this_run)
+
+def rerun_fragment():
+    # A fragment running as part of a full run cannot rerun on its own, so rerun the app then
+    st.rerun(scope="fragment" if in_fragment_rerun() else "app")
+
+def fragment(name):
+    """st.fragment that times each run of the function as `fragment.<name>`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with metrics.REGISTRY.time(f"fragment.{name}"):
+                result = func(*args, **kwargs)
+            # Full reruns sync at the top of the script; fragment reruns never get there
+            if in_fragment_rerun():
+                sync_shared_state()
+            return result
+        return st.fragment(timed)
+    return decorate
+
+get_warmup()
+get_metrics_exporter()
 
 # --- SESSION STATE INIT ---
 if 'logged_in' not in st.session_state:
@@ -50,505 +253,17 @@ if 'logged_in' not in st.session_state:
 if 'current_lesson' not in st.session_state:
     st.session_state.current_lesson = None
 
-# --- CURRICULUM ---
-CURRICULUM = {
-    "Python Basics": {
-        "lessons": [
-            {
-                "id": "variables",
-                "title": "Variables & Data Types",
-                "description": "Learn how to store and work with different types of data",
-                "content": """
-# Variables & Data Types
-
-Variables are containers that store data. Python has several built-in data types:
-
-**Common Data Types:**
-- `int` - Whole numbers (e.g., 42, -10)
-- `float` - Decimal numbers (e.g., 3.14, -0.5)
-- `str` - Text (e.g., "hello", 'world')
-- `bool` - True or False values
-
-**Example:**
-```python
-name = "Alice"          # string
-age = 25                # integer
-height = 5.6            # float
-is_student = True       # boolean
-```
-
-**Key Concepts:**
-- Variables don't need type declaration
-- Use descriptive names (snake_case)
-- Case-sensitive (age ≠ Age)
-""",
-                "exercise": "Create variables for your name, age, and favorite number. Print them all.",
-                "solution": 'name = "Your Name"\nage = 20\nfavorite_number = 7\nprint(f"Name: {name}")\nprint(f"Age: {age}")\nprint(f"Favorite Number: {favorite_number}")',
-                "quiz": [
-                    {
-                        "question": "Which data type represents whole numbers?",
-                        "options": ["float", "int", "str", "bool"],
-                        "correct": 1
-                    },
-                    {
-                        "question": "What is the correct way to assign a string to a variable?",
-                        "options": ["name = Alice", "name = 'Alice'", "str name = Alice", "name == 'Alice'"],
-                        "correct": 1
-                    }
-                ]
-            },
-            {
-                "id": "conditionals",
-                "title": "If Statements & Logic",
-                "description": "Make decisions in your code using conditional statements",
-                "content": """
-# If Statements & Logic
-
-Conditional statements let your program make decisions based on conditions.
-
-**Basic If Statement:**
-```python
-age = 18
-if age >= 18:
-    print("You are an adult")
-```
-
-**If-Else:**
-```python
-temperature = 30
-if temperature > 25:
-    print("It's hot!")
-else:
-    print("It's comfortable")
-```
-
-**If-Elif-Else:**
-```python
-score = 85
-if score >= 90:
-    grade = "A"
-elif score >= 80:
-    grade = "B"
-elif score >= 70:
-    grade = "C"
-else:
-    grade = "F"
-```
-
-**Comparison Operators:**
-- `==` equal to
-- `!=` not equal to
-- `>` greater than
-- `<` less than
-- `>=` greater than or equal
-- `<=` less than or equal
-""",
-                "exercise": "Write a program that checks if a number is positive, negative, or zero.",
-                "solution": 'number = 5\nif number > 0:\n    print("Positive")\nelif number < 0:\n    print("Negative")\nelse:\n    print("Zero")',
-                "quiz": [
-                    {
-                        "question": "What operator checks if two values are equal?",
-                        "options": ["=", "==", "===", "!="],
-                        "correct": 1
-                    },
-                    {
-                        "question": "What will this print: if 5 > 3: print('Yes')",
-                        "options": ["Yes", "No", "Error", "Nothing"],
-                        "correct": 0
-                    }
-                ]
-            },
-            {
-                "id": "loops",
-                "title": "Loops: For & While",
-                "description": "Repeat code efficiently with loops",
-                "content": """
-# Loops: For & While
-
-Loops allow you to repeat code multiple times.
-
-**For Loop (iterate over sequence):**
-```python
-# Loop through numbers
-for i in range(5):
-    print(i)  # prints 0, 1, 2, 3, 4
-
-# Loop through a list
-fruits = ["apple", "banana", "cherry"]
-for fruit in fruits:
-    print(fruit)
-```
-
-**While Loop (repeat while condition is true):**
-```python
-count = 0
-while count < 5:
-    print(count)
-    count += 1  # increment by 1
-```
-
-**Loop Control:**
-- `break` - exit the loop
-- `continue` - skip to next iteration
-
-```python
-for i in range(10):
-    if i == 5:
-        break  # stops at 5
-    print(i)
-```
-
-**Key Points:**
-- Use `for` when you know how many iterations
-- Use `while` when repeating until a condition changes
-- Be careful of infinite loops!
-""",
-                "exercise": "Write a for loop that prints numbers from 1 to 10, but skip 5.",
-                "solution": 'for i in range(1, 11):\n    if i == 5:\n        continue\n    print(i)',
-                "quiz": [
-                    {
-                        "question": "How many times will this loop run: for i in range(3):",
-                        "options": ["2", "3", "4", "infinite"],
-                        "correct": 1
-                    },
-                    {
-                        "question": "What keyword stops a loop immediately?",
-                        "options": ["stop", "end", "break", "exit"],
-                        "correct": 2
-                    }
-                ]
-            }
-        ]
-    },
-    "Functions & Modules": {
-        "lessons": [
-            {
-                "id": "functions",
-                "title": "Creating Functions",
-                "description": "Organize code into reusable functions",
-                "content": """
-# Creating Functions
-
-Functions are reusable blocks of code that perform specific tasks.
-
-**Basic Function:**
-```python
-def greet():
-    print("Hello!")
-
-greet()  # Call the function
-```
-
-**Function with Parameters:**
-```python
-def greet_person(name):
-    print(f"Hello, {name}!")
-
-greet_person("Alice")  # Output: Hello, Alice!
-```
-
-**Return Values:**
-```python
-def add_numbers(a, b):
-    return a + b
-
-result = add_numbers(5, 3)
-print(result)  # Output: 8
-```
-
-**Default Parameters:**
-```python
-def greet(name="Guest"):
-    return f"Hello, {name}!"
-
-print(greet())          # Hello, Guest!
-print(greet("Bob"))     # Hello, Bob!
-```
-
-**Why Use Functions?**
-- Organize code into logical pieces
-- Reuse code without duplication
-- Make code easier to test and debug
-- Improve readability
-""",
-                "exercise": "Create a function called 'square' that takes a number and returns its square.",
-                "solution": 'def square(number):\n    return number * number\n\nprint(square(5))  # Output: 25\nprint(square(10)) # Output: 100',
-                "quiz": [
-                    {
-                        "question": "What keyword is used to define a function?",
-                        "options": ["function", "def", "func", "define"],
-                        "correct": 1
-                    },
-                    {
-                        "question": "What does 'return' do in a function?",
-                        "options": ["Prints output", "Ends function and sends back a value", "Creates a loop", "Deletes the function"],
-                        "correct": 1
-                    }
-                ]
-            }
-        ]
-    },
-    "Data Structures": {
-        "lessons": [
-            {
-                "id": "lists",
-                "title": "Lists & Arrays",
-                "description": "Store and manipulate collections of data",
-                "content": """
-# Lists & Arrays
-
-Lists store multiple items in a single variable.
-
-**Creating Lists:**
-```python
-fruits = ["apple", "banana", "cherry"]
-numbers = [1, 2, 3, 4, 5]
-mixed = [1, "hello", 3.14, True]
-```
-
-**Accessing Elements:**
-```python
-fruits = ["apple", "banana", "cherry"]
-print(fruits[0])    # apple (first item)
-print(fruits[-1])   # cherry (last item)
-```
-
-**Common Operations:**
-```python
-# Add items
-fruits.append("orange")
-fruits.insert(1, "grape")
-
-# Remove items
-fruits.remove("banana")
-last = fruits.pop()
-
-# Length
-print(len(fruits))
-
-# Check existence
-if "apple" in fruits:
-    print("Found!")
-```
-
-**Slicing:**
-```python
-numbers = [0, 1, 2, 3, 4, 5]
-print(numbers[1:4])    # [1, 2, 3]
-print(numbers[:3])     # [0, 1, 2]
-print(numbers[3:])     # [3, 4, 5]
-```
-""",
-                "exercise": "Create a list of 5 numbers, add a new number, remove the first one, and print the result.",
-                "solution": 'numbers = [10, 20, 30, 40, 50]\nnumbers.append(60)\nnumbers.pop(0)\nprint(numbers)  # [20, 30, 40, 50, 60]',
-                "quiz": [
-                    {
-                        "question": "What index is the first element in a list?",
-                        "options": ["1", "0", "-1", "first"],
-                        "correct": 1
-                    },
-                    {
-                        "question": "Which method adds an item to the end of a list?",
-                        "options": ["add()", "append()", "insert()", "push()"],
-                        "correct": 1
-                    }
-                ]
-            }
-        ]
-    }
-}
+# Tells this tab apart from other tabs of the same user, e.g. for the progress writer
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # --- STYLING ---
-st.markdown("""
-<style>
-.stApp {
-    background: linear-gradient(120deg, #0f172a, #1e293b, #334155);
-    background-size: 300% 300%;
-    animation: gradientMove 12s ease infinite;
-    color: #f1f5f9;
-}
-
-/* Ensure text is readable with high contrast */
-.stMarkdown, .stMarkdown p, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3, 
-.stMarkdown h4, .stMarkdown li, .stMarkdown span, div, p, label, span {
-    color: #f1f5f9 !important;
-}
-
-.stChatMessage {
-    color: #f1f5f9 !important;
-}
-
-.stChatMessage p {
-    color: #f1f5f9 !important;
-}
-
-/* Specific elements for better readability */
-.stRadio label, .stCheckbox label, .stSelectbox label {
-    color: #e2e8f0 !important;
-}
-
-h1, h2, h3, h4, h5, h6 {
-    color: #f8fafc !important;
-}
-
-/* Sidebar text styling */
-.css-1d391kg, .css-1d391kg p, .css-1d391kg label, 
-[data-testid="stSidebar"], [data-testid="stSidebar"] * {
-    color: #1e293b !important;
-}
-
-[data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, 
-[data-testid="stSidebar"] h3, [data-testid="stSidebar"] h4 {
-    color: #0f172a !important;
-}
-
-[data-testid="stSidebar"] .stMarkdown {
-    color: #334155 !important;
-}
-
-@keyframes gradientMove {
-    0% {background-position: 0% 50%;}
-    50% {background-position: 100% 50%;}
-    100% {background-position: 0% 50%;}
-}
-
-.hero-section {
-    text-align: center;
-    padding: 3rem 2rem;
-    background: rgba(0, 180, 216, 0.1);
-    border-radius: 20px;
-    margin: 2rem 0;
-    backdrop-filter: blur(10px);
-}
-
-.hero-title {
-    font-size: 3.5rem;
-    font-weight: 800;
-    background: linear-gradient(120deg, #00b4d8, #0077ff, #00eaff);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    margin-bottom: 1rem;
-}
-
-.ai-badge {
-    display: inline-block;
-    background: linear-gradient(90deg, #00b4d8, #0077ff);
-    padding: 0.5rem 1.5rem;
-    border-radius: 25px;
-    font-weight: 600;
-    margin: 1rem 0;
-    box-shadow: 0 0 20px rgba(0, 180, 216, 0.5);
-}
-
-.feature-card {
-    background: rgba(255,255,255,0.08);
-    border-radius: 15px;
-    padding: 2rem;
-    margin: 1rem 0;
-    border-left: 4px solid #00b4d8;
-    backdrop-filter: blur(12px);
-    transition: all 0.3s ease;
-    height: 100%;
-}
-
-.feature-card:hover {
-    background: rgba(255,255,255,0.12);
-    transform: translateY(-5px);
-    box-shadow: 0 10px 30px rgba(0, 180, 216, 0.3);
-}
-
-.lesson-card {
-    background: rgba(255,255,255,0.08);
-    border-radius: 15px;
-    padding: 1.5rem;
-    margin: 1rem 0;
-    border-left: 4px solid #00b4d8;
-    backdrop-filter: blur(12px);
-    cursor: pointer;
-    transition: all 0.3s ease;
-}
-
-.lesson-card:hover {
-    background: rgba(255,255,255,0.12);
-    transform: translateX(5px);
-    box-shadow: 0 8px 25px rgba(0, 180, 216, 0.3);
-}
-
-.completed {
-    border-left-color: #10b981;
-}
-
-.stat-box {
-    background: rgba(0, 180, 216, 0.15);
-    border-radius: 12px;
-    padding: 1.5rem;
-    text-align: center;
-    border: 1px solid rgba(0, 180, 216, 0.3);
-}
-
-.stTextArea textarea {
-    background: rgba(15, 23, 42, 0.95) !important;
-    color: #f1f5f9 !important;
-    border: 1px solid rgba(0, 180, 216, 0.3) !important;
-    border-radius: 10px !important;
-    font-family: 'Fira Code', 'Courier New', monospace !important;
-    font-size: 14px !important;
-    line-height: 1.5 !important;
-    tab-size: 4 !important;
-    -moz-tab-size: 4 !important;
-}
-
-/* IDE-style code editor */
-.code-editor-container {
-    background: rgba(15, 23, 42, 0.95);
-    border: 1px solid rgba(0, 180, 216, 0.3);
-    border-radius: 10px;
-    padding: 10px;
-}
-
-.line-numbers {
-    color: #64748b;
-    user-select: none;
-    padding-right: 10px;
-    border-right: 1px solid rgba(100, 116, 139, 0.3);
-    font-family: 'Fira Code', monospace;
-}
-
-.stTextInput input {
-    background: rgba(15, 23, 42, 0.7) !important;
-    color: #f1f5f9 !important;
-    border: 1px solid rgba(0, 180, 216, 0.3) !important;
-}
-
-.login-container {
-    max-width: 450px;
-    margin: 0 auto;
-    padding: 2rem;
-    background: rgba(255,255,255,0.08);
-    border-radius: 20px;
-    backdrop-filter: blur(15px);
-    box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-}
-
-.progress-bar {
-    background: rgba(255,255,255,0.1);
-    height: 30px;
-    border-radius: 15px;
-    overflow: hidden;
-    margin: 1rem 0;
-}
-
-.progress-fill {
-    background: linear-gradient(90deg, #00b4d8, #0077ff);
-    height: 100%;
-    transition: width 0.5s ease;
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    font-weight: bold;
-}
-</style>
-""", unsafe_allow_html=True)
+# Built and minified once per process, then installed into the page once per session
+bundle = get_assets()
+if st.session_state.get('assets_hash') != bundle.hash:
+    with metrics.REGISTRY.time("assets.inject"):
+        components.html(bundle.loader(), height=0)
+    st.session_state.assets_hash = bundle.hash
 
 # --- LOGIN PAGE ---
 if not st.session_state.logged_in:
@@ -573,13 +288,12 @@ if not st.session_state.logged_in:
             login_password = st.text_input("Password", type="password", key="login_pass")
             
             if st.button("Login", use_container_width=True):
-                users = load_users()
-                hashed_pw = hash_password(login_password)
-                
-                if login_username in users and users[login_username] == hashed_pw:
+                if check_credentials(login_username, login_password):
                     st.session_state.logged_in = True
                     st.session_state.username = login_username
                     st.session_state.user_progress = load_user_progress(login_username)
+                    st.session_state.completed = set(st.session_state.user_progress['completed_lessons'])
+                    restore_shared_state(login_username)
                     st.success("✅ Login successful!")
                     st.rerun()
                 else:
@@ -599,13 +313,10 @@ if not st.session_state.logged_in:
                 elif len(signup_password) < 6:
                     st.error("Password must be at least 6 characters")
                 else:
-                    users = load_users()
-                    if signup_username in users:
-                        st.error("Username already exists")
-                    else:
-                        users[signup_username] = hash_password(signup_password)
-                        save_users(users)
+                    if create_user(signup_username, hash_password(signup_password)):
                         st.success("✅ Account created! Please login.")
+                    else:
+                        st.error("Username already exists")
         
         st.markdown("</div>", unsafe_allow_html=True)
     
@@ -643,28 +354,290 @@ if not st.session_state.logged_in:
         </div>
         """, unsafe_allow_html=True)
     
+    metrics.REGISTRY.timer("page.login").observe(time.perf_counter() - script_start)
     st.stop()
 
 # --- LOGGED IN - MAIN APP ---
 
-# Save progress periodically
+# Set mirror of completed_lessons for O(1) lookups while rendering
+if 'completed' not in st.session_state:
+    st.session_state.completed = set(st.session_state.user_progress['completed_lessons'])
+
+if 'shared_versions' not in st.session_state:
+    restore_shared_state(st.session_state.username)
+
+# Queue changed progress fields; the writer flushes them in the background
 if st.session_state.user_progress:
-    save_user_progress(st.session_state.username, st.session_state.user_progress)
+    with metrics.REGISTRY.time("progress.mark"):
+        get_progress_writer().mark(st.session_state.username, st.session_state.user_progress, st.session_state.session_id)
+# Chat and workspaces are written through so another worker sees them right away
+sync_shared_state()
 
 # Sidebar
 st.sidebar.title(f"👋 Hey, {st.session_state.username}!")
 if st.sidebar.button("🚪 Logout"):
-    save_user_progress(st.session_state.username, st.session_state.user_progress)
+    get_progress_writer().mark(st.session_state.username, st.session_state.user_progress, st.session_state.session_id)
+    get_progress_writer().flush(st.session_state.username)
+    get_progress_writer().forget(st.session_state.username, st.session_state.session_id)
+    sync_shared_state()
+    get_shared_state().forget(st.session_state)
+    get_transcripts().forget(st.session_state)
     st.session_state.logged_in = False
     st.session_state.username = None
     st.rerun()
 
-page = st.sidebar.radio("", ["🏠 Home", "🤖 AI Assistant", "📚 Learn", "🎯 Projects", "📊 Progress"])
+pages = ["🏠 Home", "🤖 AI Assistant", "📚 Learn", "🎯 Projects", "📊 Progress"]
+if st.session_state.username in INSTRUCTORS:
+    pages.append("🧑‍🏫 Instructor")
+if st.session_state.username in ADMINS:
+    pages.append("📈 Metrics")
+page = st.sidebar.radio("", pages)
 
 # Get API key
 api_key = st.sidebar.text_input("Groq API Key", type="password", help="Enter your Groq API key")
 st.sidebar.markdown("[Get free API key →](https://console.groq.com/keys)")
 
+# --- FRAGMENTS ---
+# Widgets inside a fragment rerun only that function; handlers that change
+# another part of the page still ask for a full st.rerun()
+@fragment("chat_pane")
+def chat_pane(api_key):
+    # Display chat history
+    chat_container = st.container(height=400)
+    with chat_container:
+        show_transcript('chat_history')
+    
+    # Chat input
+    if prompt := st.chat_input("Ask about code, request features, or get help..."):
+        # Bring the model up to date with the workspace, then add the user message
+        code_sync = context.sync_message(st.session_state.chat_history, st.session_state.current_code)
+        if code_sync:
+            st.session_state.chat_history.append(code_sync)
+        st.session_state.chat_history.append({"role": "user", "content": prompt})
+        
+        # Get AI response
+        if api_key:
+            try:
+                with chat_container:
+                    with st.chat_message("user"):
+                        st.markdown(prompt)
+                chat_context = get_context_builder().build(
+                    st.session_state.chat_history, st.session_state.current_code
+                )
+                with chat_container, st.chat_message("assistant"):
+                    suggested = []
+                    ai_message = st.write_stream(parse_reply(suggested, get_dispatcher().stream(
+                        st.session_state.username,
+                        api_key,
+                        site="assistant",
+                        model="llama-3.1-8b-instant",
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": (
+                                    "You are LexIQ, a Socratic coding tutor. Your goal is to help users LEARN through discovery, not just give answers.\n\n"
+                                    "CRITICAL TEACHING PHILOSOPHY:\n"
+                                    "1. NEVER give complete code solutions directly - make them work for it\n"
+                                    "2. Be intentionally vague at first - give hints, not answers\n"
+                                    "3. Ask probing questions to guide their thinking\n"
+                                    "4. Only reveal code after they've attempted to understand the concept\n"
+                                    "5. Break complex tasks into tiny micro-steps\n"
+                                    "6. Make them ask follow-up questions to get more detail\n"
+                                    "7. When debugging, point to the AREA of the problem, not the exact fix\n"
+                                    "8. Challenge their assumptions with questions\n\n"
+                                    "RESPONSE PATTERN:\n"
+                                    "- First response: Ask what they're trying to achieve and what they've tried\n"
+                                    "- Second response: Give a conceptual hint or ask about their understanding\n"
+                                    "- Third response: Maybe show a small piece of pseudocode or pattern\n"
+                                    "- Fourth+ response: Only then consider showing actual code, one tiny piece at a time\n\n"
+                                    "When they ask for help building something:\n"
+                                    "- Ask: 'What's the first step you think we need?'\n"
+                                    "- Ask: 'How would you approach this?'\n"
+                                    "- Ask: 'What do you already know that might help here?'\n\n"
+                                    "When debugging:\n"
+                                    "- Ask: 'What do you think this error means?'\n"
+                                    "- Say: 'Look at line X - what's happening there?'\n"
+                                    "- Ask: 'What values do you expect vs what are you getting?'\n\n"
+                                    "Format code suggestions ONLY after discussion like:\n"
+                                    "CONCEPT: [explain the idea]\n"
+                                    "QUESTION: [check their understanding]\n"
+                                    "If they answer correctly, THEN:\n"
+                                    "CODE_CHANGE:\n```python\n[tiny code snippet - 1-3 lines max]\n```\n"
+                                    "WHY: [explain this specific piece]\n"
+                                    "NEXT: [what should they think about next?]\n\n"
+                                    "The student's code is shared in the conversation: a full snapshot, then diffs of their edits.\n\n"
+                                    "Be patient, ask questions, and make them think. Learning happens through struggle."
+                                )
+                            },
+                            *chat_context.messages
+                        ],
+                        temperature=0.4,
+                    )))
+                    st.session_state.chat_history.append({"role": "assistant", "content": ai_message})
+                    
+                    # Award points for interaction
+                    award_points('chat', 5)
+                    # A new suggestion also has to show up in the pending-change panel
+                    if suggested:
+                        st.rerun(scope="app")
+                    rerun_fragment()
+            except Exception as e:
+                st.error(llm.describe_error(e))
+        else:
+            st.session_state.chat_history.append({
+                "role": "assistant",
+                "content": "⚠️ Please add your Groq API key in the sidebar to use the AI assistant!"
+            })
+            rerun_fragment()
+
+@fragment("code_workspace")
+def code_workspace():
+    # Typing and running code only reruns the editor
+    st.session_state.current_code = st.text_area(
+        "Write your code here:",
+        value=st.session_state.current_code,
+        height=300,
+        key="code_workspace"
+    )
+    
+    if st.button("▶️ Run Code", use_container_width=True, key="run_code_workspace"):
+        if st.session_state.current_code.strip():
+            show_run_result(get_code_runner().run(st.session_state.current_code))
+        else:
+            st.warning("Write some code first!")
+
+@fragment("pending_change")
+def pending_change_panel():
+    if st.session_state.pending_changes:
+        st.markdown("---")
+        st.markdown("#### 📝 Suggested Change")
+        
+        change = st.session_state.pending_changes[0]
+        
+        with st.container():
+            st.markdown("**Understanding the change:**")
+            st.info(change['explanation'])
+            
+            st.markdown("**Proposed code:**")
+            st.code(change['code'], language='python')
+            if change.get('why'):
+                st.markdown(f"**Why:** {change['why']}")
+            if len(st.session_state.pending_changes) > 1:
+                st.caption(f"{len(st.session_state.pending_changes) - 1} more suggested after this one")
+            
+            col_a, col_b, col_c = st.columns(3)
+            
+            with col_a:
+                if st.button("✅ Apply Change", use_container_width=True):
+                    # Apply the change to current code
+                    st.session_state.current_code += "\n\n" + change['code']
+                    st.session_state.pending_changes.pop(0)
+                    award_points('apply_change', 10)
+                    st.session_state.chat_history.append({
+                        "role": "user",
+                        "content": "I applied the change. What's next?"
+                    })
+                    st.rerun()
+            
+            with col_b:
+                if st.button("❓ Explain More", use_container_width=True):
+                    st.session_state.chat_history.append({
+                        "role": "user",
+                        "content": f"Can you explain this in more detail? I don't fully understand:\n```python\n{change['code']}\n```"
+                    })
+                    st.rerun()
+            
+            with col_c:
+                if st.button("❌ Skip", use_container_width=True):
+                    st.session_state.pending_changes.pop(0)
+                    rerun_fragment()
+
+@fragment("quiz_question")
+def quiz_question(lesson_id, i, q):
+    # Answering one question leaves the lesson and the other questions alone
+    st.markdown(f"**Question {i+1}:** {q['question']}")
+    answer = st.radio("", q['options'], key=f"q_{lesson_id}_{i}")
+    if st.button("Submit Answer", key=f"submit_{lesson_id}_{i}"):
+        correct = q['options'].index(answer) == q['correct']
+        record_quiz_answer(lesson_id, i, correct)
+        if correct:
+            st.success("✅ Correct!")
+            award_points('quiz', 10)
+        else:
+            st.error(f"❌ Wrong. Correct answer: {q['options'][q['correct']]}")
+
+@fragment("project_workspace")
+def project_workspace(project):
+    # Code editor with line numbers feel
+    st.markdown("<div class='code-editor-container'>", unsafe_allow_html=True)
+    st.session_state.project_code = st.text_area(
+        "Type your code here (Tab for indent, Enter auto-indents):",
+        value=st.session_state.project_code,
+        height=450,
+        key="project_workspace",
+        help="💡 Use Tab key for indentation. After typing ':', press Enter to auto-indent!"
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+    
+    if st.button("▶️ Run Code", use_container_width=True, key="run_project_workspace"):
+        show_run_result(get_code_runner().run(st.session_state.project_code))
+    
+    # Progress indicator
+    if st.session_state.project_progress > 0:
+        st.info(
+        f"""🎯 Engagement Level: {min(st.session_state.project_progress, 5)}/5 - 
+    {'Keep going!' if st.session_state.project_progress < 5 else "You're doing great!"}"""
+        )
+    
+    col_a, col_b, col_c = st.columns(3)
+    
+    with col_a:
+        if st.button("💡 Give Hint", use_container_width=True):
+            st.session_state.project_chat.append({
+                "role": "user",
+                "content": "I'm stuck. Can you give me a hint about what to do next?"
+            })
+            # Serve the next banked hint instantly; past the ladder the AI takes over.
+            # The count is kept in state, as older chat messages may be paged out.
+            level = st.session_state.project_hints + 1
+            banked_hint = get_hint_bank().hint(f"project:{project['id']}", level)
+            if banked_hint:
+                st.session_state.project_hints = level
+                st.session_state.project_chat.append({
+                    "role": "assistant",
+                    "content": f"💡 Hint {level}: {banked_hint}",
+                    "hint_level": level
+                })
+            st.rerun()
+    
+    with col_b:
+        if st.button("✅ Check Progress", use_container_width=True):
+            findings = analysis.analyze(st.session_state.project_code)
+            intro = "Here's my current code. Am I on the right track?"
+            st.session_state.project_chat.append(context.sync_message(
+                st.session_state.project_chat,
+                st.session_state.project_code,
+                intro=intro if findings else f"{intro}\n{analysis.NO_FINDINGS_NOTE}"
+            ))
+            if findings:
+                st.session_state.project_chat.append({
+                    "role": "assistant",
+                    "content": analysis.findings_message(findings)
+                })
+            st.rerun()
+    
+    with col_c:
+        if st.button("🎯 What's Next?", use_container_width=True):
+            st.session_state.project_chat.append({
+                "role": "user",
+                "content": "What should I work on next?"
+            })
+            st.rerun()
+
+# Page bodies are timed from here to the end of the script; runs that end
+# in st.rerun() or st.stop() are not counted
+page_start = time.perf_counter()
+
 # --- HOME PAGE ---
 if page == "🏠 Home":
     st.markdown("""
@@ -687,7 +660,7 @@ if page == "🏠 Home":
     with col2:
         st.markdown(f"""
         <div class='stat-box'>
-            <h2>{len(st.session_state.user_progress['completed_lessons'])}</h2>
+            <h2>{INDEX.completed_count(st.session_state.completed)}</h2>
             <p>Lessons Done</p>
         </div>
         """, unsafe_allow_html=True)
@@ -701,8 +674,8 @@ if page == "🏠 Home":
         """, unsafe_allow_html=True)
     
     with col4:
-        total_lessons = sum(len(track['lessons']) for track in CURRICULUM.values())
-        completion = len(st.session_state.user_progress['completed_lessons']) / total_lessons * 100 if total_lessons > 0 else 0
+        total_lessons = INDEX.total
+        completion = INDEX.completed_count(st.session_state.completed) / total_lessons * 100 if total_lessons > 0 else 0
         st.markdown(f"""
         <div class='stat-box'>
             <h2>{completion:.0f}%</h2>
@@ -770,150 +743,12 @@ elif page == "🤖 AI Assistant":
     
     with col1:
         st.markdown("#### 💬 Chat with AI")
-        
-        # Display chat history
-        chat_container = st.container(height=400)
-        with chat_container:
-            for message in st.session_state.chat_history:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
-        
-        # Chat input
-        if prompt := st.chat_input("Ask about code, request features, or get help..."):
-            # Add user message to history
-            st.session_state.chat_history.append({"role": "user", "content": prompt})
-            
-            # Get AI response
-            if api_key:
-                try:
-                    client = Groq(api_key=api_key)
-                    with st.spinner("Thinking..."):
-                        response = client.chat.completions.create(
-                            model="llama-3.1-8b-instant",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": (
-                                        "You are LexIQ, a Socratic coding tutor. Your goal is to help users LEARN through discovery, not just give answers.\n\n"
-                                        "CRITICAL TEACHING PHILOSOPHY:\n"
-                                        "1. NEVER give complete code solutions directly - make them work for it\n"
-                                        "2. Be intentionally vague at first - give hints, not answers\n"
-                                        "3. Ask probing questions to guide their thinking\n"
-                                        "4. Only reveal code after they've attempted to understand the concept\n"
-                                        "5. Break complex tasks into tiny micro-steps\n"
-                                        "6. Make them ask follow-up questions to get more detail\n"
-                                        "7. When debugging, point to the AREA of the problem, not the exact fix\n"
-                                        "8. Challenge their assumptions with questions\n\n"
-                                        "RESPONSE PATTERN:\n"
-                                        "- First response: Ask what they're trying to achieve and what they've tried\n"
-                                        "- Second response: Give a conceptual hint or ask about their understanding\n"
-                                        "- Third response: Maybe show a small piece of pseudocode or pattern\n"
-                                        "- Fourth+ response: Only then consider showing actual code, one tiny piece at a time\n\n"
-                                        "When they ask for help building something:\n"
-                                        "- Ask: 'What's the first step you think we need?'\n"
-                                        "- Ask: 'How would you approach this?'\n"
-                                        "- Ask: 'What do you already know that might help here?'\n\n"
-                                        "When debugging:\n"
-                                        "- Ask: 'What do you think this error means?'\n"
-                                        "- Say: 'Look at line X - what's happening there?'\n"
-                                        "- Ask: 'What values do you expect vs what are you getting?'\n\n"
-                                        "Format code suggestions ONLY after discussion like:\n"
-                                        "CONCEPT: [explain the idea]\n"
-                                        "QUESTION: [check their understanding]\n"
-                                        "If they answer correctly, THEN:\n"
-                                        "CODE_CHANGE:\n```python\n[tiny code snippet - 1-3 lines max]\n```\n"
-                                        "WHY: [explain this specific piece]\n"
-                                        "NEXT: [what should they think about next?]\n\n"
-                                        f"Current code:\n{st.session_state.current_code}\n\n"
-                                        "Be patient, ask questions, and make them think. Learning happens through struggle."
-                                    )
-                                },
-                                *[{"role": m["role"], "content": m["content"]} for m in st.session_state.chat_history[-10:]]
-                            ],
-                            temperature=0.4,
-                        )
-                        ai_message = response.choices[0].message.content
-                        st.session_state.chat_history.append({"role": "assistant", "content": ai_message})
-                        
-                        # Check if AI suggested a code change
-                        if "```python" in ai_message:
-                            # Extract code snippet
-                            code_start = ai_message.find("```python") + 9
-                            code_end = ai_message.find("```", code_start)
-                            code_snippet = ai_message[code_start:code_end].strip()
-                            
-                            # Extract explanation (text before code)
-                            explanation = ai_message[:ai_message.find("```python")].strip()
-                            
-                            # Add to pending changes
-                            st.session_state.pending_changes.append({
-                                'explanation': explanation,
-                                'code': code_snippet
-                            })
-                        
-                        # Award points for interaction
-                        st.session_state.user_progress['total_points'] += 5
-                        st.rerun()
-                except Exception as e:
-                    st.error(f"Error: {e}")
-            else:
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": "⚠️ Please add your Groq API key in the sidebar to use the AI assistant!"
-                })
-                st.rerun()
+        chat_pane(api_key)
     
     with col2:
         st.markdown("#### 💻 Your Code Workspace")
-        
-        # Code editor
-        st.session_state.current_code = st.text_area(
-            "Write your code here:",
-            value=st.session_state.current_code,
-            height=300,
-            key="code_workspace"
-        )
-        
-        # Pending changes section
-        if st.session_state.pending_changes:
-            st.markdown("---")
-            st.markdown("#### 📝 Suggested Change")
-            
-            change = st.session_state.pending_changes[0]
-            
-            with st.container():
-                st.markdown("**Understanding the change:**")
-                st.info(change['explanation'])
-                
-                st.markdown("**Proposed code:**")
-                st.code(change['code'], language='python')
-                
-                col_a, col_b, col_c = st.columns(3)
-                
-                with col_a:
-                    if st.button("✅ Apply Change", use_container_width=True):
-                        # Apply the change to current code
-                        st.session_state.current_code += "\n\n" + change['code']
-                        st.session_state.pending_changes.pop(0)
-                        st.session_state.user_progress['total_points'] += 10
-                        st.session_state.chat_history.append({
-                            "role": "user",
-                            "content": "I applied the change. What's next?"
-                        })
-                        st.rerun()
-                
-                with col_b:
-                    if st.button("❓ Explain More", use_container_width=True):
-                        st.session_state.chat_history.append({
-                            "role": "user",
-                            "content": f"Can you explain this in more detail? I don't fully understand:\n```python\n{change['code']}\n```"
-                        })
-                        st.rerun()
-                
-                with col_c:
-                    if st.button("❌ Skip", use_container_width=True):
-                        st.session_state.pending_changes.pop(0)
-                        st.rerun()
+        code_workspace()
+        pending_change_panel()
         
         # Quick action buttons
         st.markdown("---")
@@ -931,10 +766,18 @@ elif page == "🤖 AI Assistant":
         with col_y:
             if st.button("🐛 Help Debug", use_container_width=True):
                 if st.session_state.current_code:
+                    # Common mistakes are answered locally; anything else goes to the AI
+                    findings = analysis.analyze(st.session_state.current_code)
+                    question = f"Something's wrong with my code. Can you help me find the issue?\n```python\n{st.session_state.current_code}\n```"
                     st.session_state.chat_history.append({
                         "role": "user",
-                        "content": f"Something's wrong with my code. Can you help me find the issue?\n```python\n{st.session_state.current_code}\n```"
+                        "content": question if findings else f"{question}\n{analysis.NO_FINDINGS_NOTE}"
                     })
+                    if findings:
+                        st.session_state.chat_history.append({
+                            "role": "assistant",
+                            "content": analysis.findings_message(findings)
+                        })
                     st.rerun()
                 else:
                     st.warning("Write some code first!")
@@ -971,7 +814,7 @@ elif page == "📚 Learn":
         st.markdown(f"### {track_name}")
         
         for lesson in track_data['lessons']:
-            is_completed = lesson['id'] in st.session_state.user_progress['completed_lessons']
+            is_completed = lesson['id'] in st.session_state.completed
             status = "✅" if is_completed else "📖"
             card_class = "lesson-card completed" if is_completed else "lesson-card"
             
@@ -983,13 +826,14 @@ elif page == "📚 Learn":
                     st.markdown(f"<small>{lesson['description']}</small>", unsafe_allow_html=True)
                 with col2:
                     if st.button("Open →", key=f"open_{lesson['id']}"):
-                        st.session_state.current_lesson = lesson
+                        st.session_state.current_lesson = lesson['id']
                         st.rerun()
                 st.markdown("</div>", unsafe_allow_html=True)
     
     # Display selected lesson
+    # Only the id lives in the session; the lesson body comes from the shared cache
     if st.session_state.current_lesson:
-        lesson = st.session_state.current_lesson
+        lesson = get_lesson(st.session_state.current_lesson)
         st.markdown("---")
         st.markdown(f"## {lesson['title']}")
         
@@ -1000,25 +844,56 @@ elif page == "📚 Learn":
         
         user_code = st.text_area("Your Solution:", height=150, key="exercise_code")
         
-        col1, col2, col3 = st.columns(3)
+        # Early hints come straight from the pre-generated hint bank
+        if 'lesson_hints' not in st.session_state:
+            st.session_state.lesson_hints = {}
+        hint_ladder = get_hint_bank().ladder(f"lesson:{lesson['id']}")
+        for level, hint in enumerate(hint_ladder[:st.session_state.lesson_hints.get(lesson['id'], 0)], 1):
+            st.info(f"💡 Hint {level}: {hint}")
+        
+        if lesson.get('tests') and st.button("▶️ Run & Check", type="primary"):
+            if not user_code.strip():
+                st.warning("Write your solution first!")
+            else:
+                verdict = get_code_runner().run(user_code, lesson['tests'])
+                show_run_result(verdict)
+                if verdict.passed:
+                    st.success("🎉 All checks passed!")
+                    if lesson['id'] not in st.session_state.completed:
+                        award_points('lesson', 50, lesson['id'])
+                        st.success("Lesson completed! +50 points")
+                        st.balloons()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col4:
+            shown = st.session_state.lesson_hints.get(lesson['id'], 0)
+            if st.button("💡 Get a Hint", disabled=not hint_ladder):
+                if shown < len(hint_ladder):
+                    st.session_state.lesson_hints[lesson['id']] = shown + 1
+                    st.rerun()
+                else:
+                    st.warning("That's all the quick hints - try 🤖 Ask AI for Help!")
+        
         with col1:
             if st.button("🤖 Ask AI for Help"):
                 if api_key and user_code:
                     try:
-                        client = Groq(api_key=api_key)
-                        with st.spinner("Getting AI feedback..."):
-                            response = client.chat.completions.create(
-                                model="llama-3.1-8b-instant",
-                                messages=[
-                                    {"role": "system", "content": "You are a helpful coding tutor. Review student code and provide constructive feedback."},
-                                    {"role": "user", "content": f"Exercise: {lesson['exercise']}\n\nStudent's code:\n{user_code}\n\nProvide feedback."}
-                                ],
-                                temperature=0.3,
-                            )
-                            st.success("AI Feedback:")
-                            st.write(response.choices[0].message.content)
+                        st.success("AI Feedback:")
+                        st.write_stream(get_dispatcher().stream(
+                            st.session_state.username,
+                            api_key,
+                            site="lesson_feedback",
+                            model="llama-3.1-8b-instant",
+                            messages=[
+                                {"role": "system", "content": "You are a helpful coding tutor. Review student code and provide constructive feedback."},
+                                {"role": "user", "content": f"Exercise: {lesson['exercise']}\n\nStudent's code:\n{user_code}\n\nProvide feedback."}
+                            ],
+                            # Same exercise and code, same review: deterministic, so it can be cached
+                            temperature=0,
+                            cache=True,
+                        ))
                     except Exception as e:
-                        st.error(f"Error: {e}")
+                        st.error(llm.describe_error(e))
                 else:
                     st.warning("Please enter API key and code.")
         
@@ -1028,9 +903,8 @@ elif page == "📚 Learn":
         
         with col3:
             if st.button("✅ Mark Complete"):
-                if lesson['id'] not in st.session_state.user_progress['completed_lessons']:
-                    st.session_state.user_progress['completed_lessons'].append(lesson['id'])
-                    st.session_state.user_progress['total_points'] += 50
+                if lesson['id'] not in st.session_state.completed:
+                    award_points('lesson', 50, lesson['id'])
                     st.success("🎉 Lesson completed! +50 points")
                     st.balloons()
                     st.rerun()
@@ -1038,14 +912,7 @@ elif page == "📚 Learn":
         # Quiz
         st.markdown("### 🎯 Knowledge Check")
         for i, q in enumerate(lesson['quiz']):
-            st.markdown(f"**Question {i+1}:** {q['question']}")
-            answer = st.radio("", q['options'], key=f"q_{lesson['id']}_{i}")
-            if st.button("Submit Answer", key=f"submit_{lesson['id']}_{i}"):
-                if q['options'].index(answer) == q['correct']:
-                    st.success("✅ Correct!")
-                    st.session_state.user_progress['total_points'] += 10
-                else:
-                    st.error(f"❌ Wrong. Correct answer: {q['options'][q['correct']]}")
+            quiz_question(lesson['id'], i, q)
 
 # --- PROJECTS PAGE ---
 elif page == "🎯 Projects":
@@ -1063,81 +930,10 @@ elif page == "🎯 Projects":
         st.session_state.project_progress = 0
     if 'code_given' not in st.session_state:
         st.session_state.code_given = False
+    if 'project_hints' not in st.session_state:
+        st.session_state.project_hints = 0
     
-    projects = [
-        {
-            "id": "calculator",
-            "title": "🧮 Calculator App",
-            "difficulty": "Beginner",
-            "description": "Build a basic calculator that can add, subtract, multiply, and divide numbers.",
-            "skills": ["Functions", "User Input", "Conditionals", "Math Operations"],
-            "starter_prompt": "Let's build a calculator together! I'll guide you step by step. First, what do you think the calculator needs to do?",
-            "help_level": 5  # 5 = most help, 1 = least help
-        },
-        {
-            "id": "guess_number",
-            "title": "🎲 Number Guessing Game",
-            "difficulty": "Beginner",
-            "description": "Create a game where the computer picks a random number and the user tries to guess it.",
-            "skills": ["Random Module", "Loops", "Conditionals", "User Input"],
-            "starter_prompt": "We're building a guessing game! The computer will pick a number and the player guesses. What's the first thing we need to do?",
-            "help_level": 5
-        },
-        {
-            "id": "quiz_game",
-            "title": "📝 Quiz Game",
-            "difficulty": "Beginner",
-            "description": "Create a multiple-choice quiz game that tracks the score.",
-            "skills": ["Lists", "Dictionaries", "Loops", "Conditionals"],
-            "starter_prompt": "We're building a quiz game! It will ask questions and track the score. How should we store the questions and answers?",
-            "help_level": 4
-        },
-        {
-            "id": "todo_list",
-            "title": "✅ To-Do List Manager",
-            "difficulty": "Intermediate",
-            "description": "Build a to-do list where users can add, remove, and view tasks.",
-            "skills": ["Lists", "Loops", "Functions", "String Manipulation"],
-            "starter_prompt": "Let's create a to-do list app! Users should be able to add, view, and remove tasks. What data structure would work well for storing tasks?",
-            "help_level": 3
-        },
-        {
-            "id": "password_gen",
-            "title": "🔐 Password Generator",
-            "difficulty": "Intermediate",
-            "description": "Create a tool that generates secure random passwords based on user preferences.",
-            "skills": ["Random Module", "Strings", "Loops", "User Input"],
-            "starter_prompt": "We're building a password generator! It should create random passwords with letters, numbers, and symbols. What's your first thought on how to approach this?",
-            "help_level": 3
-        },
-        {
-            "id": "hangman",
-            "title": "🎮 Hangman Game",
-            "difficulty": "Intermediate",
-            "description": "Build the classic word guessing game with lives and letter tracking.",
-            "skills": ["Lists", "Strings", "Loops", "Conditionals", "Game Logic"],
-            "starter_prompt": "Let's make Hangman! Players guess letters to find a hidden word. What are the main components we need to track?",
-            "help_level": 2
-        },
-        {
-            "id": "contact_book",
-            "title": "📇 Contact Book",
-            "difficulty": "Intermediate",
-            "description": "Build a contact manager to store names, phone numbers, and emails.",
-            "skills": ["Dictionaries", "Lists", "Functions", "File I/O"],
-            "starter_prompt": "Let's create a contact book! Users can add, search, and delete contacts. What's the best way to store contact information?",
-            "help_level": 2
-        },
-        {
-            "id": "text_adventure",
-            "title": "🗺️ Text Adventure Game",
-            "difficulty": "Advanced",
-            "description": "Create an interactive story game where choices affect the outcome.",
-            "skills": ["Functions", "Dictionaries", "Conditionals", "Game Design"],
-            "starter_prompt": "We're building a text adventure! Players make choices that change the story. How should we structure the game flow?",
-            "help_level": 1
-        }
-    ]
+    projects = PROJECTS
     
     if not st.session_state.selected_project:
         # Project selection grid
@@ -1170,6 +966,7 @@ elif page == "🎯 Projects":
                     }]
                     st.session_state.project_progress = 0
                     st.session_state.code_given = False
+                    st.session_state.project_hints = 0
                     st.rerun()
     
     else:
@@ -1185,6 +982,7 @@ elif page == "🎯 Projects":
             st.session_state.project_chat = []
             st.session_state.project_progress = 0
             st.session_state.code_given = False
+            st.session_state.project_hints = 0
             st.rerun()
         
         st.markdown(f"## {project['title']}")
@@ -1196,18 +994,21 @@ elif page == "🎯 Projects":
             # Chat container
             chat_container = st.container(height=450)
             with chat_container:
-                for message in st.session_state.project_chat:
-                    with st.chat_message(message["role"]):
-                        st.markdown(message["content"])
+                show_transcript('project_chat')
             
             # Chat input
             if prompt := st.chat_input("Ask for guidance or share your progress..."):
+                code_sync = context.sync_message(st.session_state.project_chat, st.session_state.project_code)
+                if code_sync:
+                    st.session_state.project_chat.append(code_sync)
                 st.session_state.project_chat.append({"role": "user", "content": prompt})
                 
                 if api_key:
                     try:
-                        client = Groq(api_key=api_key)
-                        with st.spinner("AI is thinking..."):
+                        with chat_container:
+                            with st.chat_message("user"):
+                                st.markdown(prompt)
+                        with chat_container, st.chat_message("assistant"):
                             # Determine help level based on project difficulty
                             help_level = project.get('help_level', 3)
                             
@@ -1250,6 +1051,9 @@ elif page == "🎯 Projects":
                             progress_indicators = ["i think", "maybe", "should i", "how about", "what if"]
                             shows_effort = any(indicator in prompt.lower() for indicator in progress_indicators)
                             
+                            chat_context = get_context_builder().build(
+                                st.session_state.project_chat, st.session_state.project_code
+                            )
                             system_prompt = (
                                 f"You are guiding a student to build: {project['title']}\n"
                                 f"Project goal: {project['description']}\n\n"
@@ -1278,19 +1082,21 @@ elif page == "🎯 Projects":
                                 "Beginner = more code snippets, Advanced = mostly questions.\n\n"
                                 f"""Student's engagement level: {"HIGH - they're thinking!" if shows_effort else "Check their understanding"}\n\n"""
 
-                                f"Current student code:\n{st.session_state.project_code}\n\n"
+                                "The student's code is shared in the conversation: a full snapshot, then diffs of their edits.\n\n"
                                 "Be encouraging, adaptive, and help them build confidence through incremental success."
                             )
                             
-                            response = client.chat.completions.create(
+                            ai_message = st.write_stream(get_dispatcher().stream(
+                                st.session_state.username,
+                                api_key,
+                                site="project_guide",
                                 model="llama-3.1-8b-instant",
                                 messages=[
                                     {"role": "system", "content": system_prompt},
-                                    *[{"role": m["role"], "content": m["content"]} for m in st.session_state.project_chat[-10:]]
+                                    *chat_context.messages
                                 ],
                                 temperature=0.5,
-                            )
-                            ai_message = response.choices[0].message.content
+                            ))
                             st.session_state.project_chat.append({"role": "assistant", "content": ai_message})
                             
                             # Track progress
@@ -1301,10 +1107,10 @@ elif page == "🎯 Projects":
                             if "```python" in ai_message:
                                 st.session_state.code_given = True
                             
-                            st.session_state.user_progress['total_points'] += 5
+                            award_points('project_chat', 5)
                             st.rerun()
                     except Exception as e:
-                        st.error(f"Error: {e}")
+                        st.error(llm.describe_error(e))
                 else:
                     st.session_state.project_chat.append({
                         "role": "assistant",
@@ -1315,95 +1121,8 @@ elif page == "🎯 Projects":
         with col2:
             st.markdown("#### 💻 Your Code")
             
-            # IDE-style code editor with JavaScript for tab support
-            st.markdown("""
-            <script>
-            document.addEventListener('DOMContentLoaded', function() {
-                const textareas = document.querySelectorAll('textarea');
-                textareas.forEach(textarea => {
-                    textarea.addEventListener('keydown', function(e) {
-                        // Tab key support
-                        if (e.key === 'Tab') {
-                            e.preventDefault();
-                            const start = this.selectionStart;
-                            const end = this.selectionEnd;
-                            const value = this.value;
-                            
-                            // Insert 4 spaces
-                            this.value = value.substring(0, start) + '    ' + value.substring(end);
-                            this.selectionStart = this.selectionEnd = start + 4;
-                        }
-                        
-                        // Auto-indent on Enter
-                        if (e.key === 'Enter') {
-                            const start = this.selectionStart;
-                            const value = this.value;
-                            const lines = value.substring(0, start).split('\\n');
-                            const currentLine = lines[lines.length - 1];
-                            
-                            // Count leading spaces
-                            const leadingSpaces = currentLine.match(/^\\s*/)[0];
-                            
-                            // Check if line ends with : (function, if, for, while, etc.)
-                            const needsExtraIndent = currentLine.trim().endsWith(':');
-                            
-                            setTimeout(() => {
-                                const newStart = this.selectionStart;
-                                const indent = needsExtraIndent ? leadingSpaces + '    ' : leadingSpaces;
-                                this.value = this.value.substring(0, newStart) + indent + this.value.substring(newStart);
-                                this.selectionStart = this.selectionEnd = newStart + indent.length;
-                            }, 0);
-                        }
-                    });
-                });
-            });
-            </script>
-            """, unsafe_allow_html=True)
-            
-            # Code editor with line numbers feel
-            st.markdown("<div class='code-editor-container'>", unsafe_allow_html=True)
-            st.session_state.project_code = st.text_area(
-                "Type your code here (Tab for indent, Enter auto-indents):",
-                value=st.session_state.project_code,
-                height=450,
-                key="project_workspace",
-                help="💡 Use Tab key for indentation. After typing ':', press Enter to auto-indent!"
-            )
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-            # Progress indicator
-            if st.session_state.project_progress > 0:
-                st.info(
-    f"""🎯 Engagement Level: {min(st.session_state.project_progress, 5)}/5 - 
-    {'Keep going!' if st.session_state.project_progress < 5 else "You're doing great!"}"""
-)
-
-            
-            col_a, col_b, col_c = st.columns(3)
-            
-            with col_a:
-                if st.button("💡 Give Hint", use_container_width=True):
-                    st.session_state.project_chat.append({
-                        "role": "user",
-                        "content": "I'm stuck. Can you give me a hint about what to do next?"
-                    })
-                    st.rerun()
-            
-            with col_b:
-                if st.button("✅ Check Progress", use_container_width=True):
-                    st.session_state.project_chat.append({
-                        "role": "user",
-                        "content": f"Here's my current code. Am I on the right track?\n```python\n{st.session_state.project_code}\n```"
-                    })
-                    st.rerun()
-            
-            with col_c:
-                if st.button("🎯 What's Next?", use_container_width=True):
-                    st.session_state.project_chat.append({
-                        "role": "user",
-                        "content": "What should I work on next?"
-                    })
-                    st.rerun()
+            # Tab and auto-indent come from the editor script in the asset bundle
+            project_workspace(project)
         
         # Progress indicator
         st.markdown("---")
@@ -1419,8 +1138,7 @@ elif page == "🎯 Projects":
             st.markdown("**📊 Difficulty:** " + difficulty_info.get(project['difficulty'], ""))
         
         if st.button("✅ Mark Project Complete", type="primary"):
-            st.session_state.user_progress['total_points'] += 100
-            st.session_state.user_progress['completed_lessons'].append(f"project_{project['id']}")
+            award_points('project', 100, f"project_{project['id']}")
             st.success(f"🎉 Awesome! You completed {project['title']}! +100 points")
             st.balloons()
             st.session_state.selected_project = None
@@ -1428,14 +1146,15 @@ elif page == "🎯 Projects":
             st.session_state.project_chat = []
             st.session_state.project_progress = 0
             st.session_state.code_given = False
+            st.session_state.project_hints = 0
             st.rerun()
 
 # --- PROGRESS PAGE ---
 elif page == "📊 Progress":
     st.title("📊 Your Progress")
     
-    total_lessons = sum(len(track['lessons']) for track in CURRICULUM.values())
-    completed = len(st.session_state.user_progress['completed_lessons'])
+    total_lessons = INDEX.total
+    completed = INDEX.completed_count(st.session_state.completed)
     progress_pct = (completed / total_lessons * 100) if total_lessons > 0 else 0
     
     st.markdown(f"""
@@ -1454,7 +1173,7 @@ elif page == "📊 Progress":
     achievements = [
         ("🎯", "First Steps", "Complete your first lesson", completed >= 1),
         ("🔥", "On Fire", "Complete 5 lessons", completed >= 5),
-        ("📚", "Bookworm", "Complete an entire track", completed >= 3),
+        ("📚", "Bookworm", "Complete an entire track", bool(INDEX.completed_tracks(st.session_state.completed))),
         ("💯", "Code Master", "Earn 500 points", st.session_state.user_progress['total_points'] >= 500),
     ]
     
@@ -1470,6 +1189,19 @@ elif page == "📊 Progress":
             </div>
             """, unsafe_allow_html=True)
     
+    st.markdown("---")
+    st.markdown("### 🏅 Leaderboard")
+    
+    board = get_leaderboard()
+    rank = board.rank(st.session_state.username)
+    if rank is None:
+        st.markdown("Earn some points to join the leaderboard!")
+    else:
+        st.markdown(f"**You're #{rank} of {len(board)} coders**")
+    for place, name, points in board.top(10):
+        marker = " ← you" if name == st.session_state.username else ""
+        st.markdown(f"{place}. **{name}** — {points} points{marker}")
+    
     st.markdown("---")
     st.markdown("### 📈 Learning Stats")
     
@@ -1480,3 +1212,113 @@ elif page == "📊 Progress":
     with col2:
         st.metric("Current Streak", f"{st.session_state.user_progress['current_streak']} days")
         st.metric("Lessons Remaining", total_lessons - completed)
+
+elif page == "🧑‍🏫 Instructor":
+    st.title("🧑‍🏫 Instructor Insights")
+    
+    # Pulls in NumPy, so only this page pays for the import
+    import insights
+    path = insights.DEFAULT_PATH
+    if not os.path.exists(path):
+        st.info("No insights yet. Run `python insights.py` to build them from every student's progress.")
+    else:
+        data = get_insights(path, os.path.getmtime(path))
+        funnel = data.funnel()
+        built = datetime.fromtimestamp(float(data.generated_at))
+        st.caption(f"Built {built:%Y-%m-%d %H:%M} from {int(data.users)} students. Run `python insights.py` again to refresh.")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Students", int(data.users))
+        with col2:
+            st.metric("Median Points", f"{data.points_percentile(50)}+")
+        with col3:
+            st.metric("Finished the Course", f"{funnel[-1][3]:.0%}" if funnel else "-")
+        
+        st.markdown("---")
+        st.markdown("### 📉 Lesson Funnel")
+        st.dataframe({
+            "Track": [track for track, _, _, _ in funnel],
+            "Lesson": [title for _, title, _, _ in funnel],
+            "Completed": [count for _, _, count, _ in funnel],
+            "% of Students": [round(share * 100, 1) for _, _, _, share in funnel],
+        }, hide_index=True, use_container_width=True)
+        
+        st.markdown("### ❓ Quiz Accuracy")
+        accuracy = data.question_accuracy()
+        if not accuracy:
+            st.markdown("No quiz answers recorded yet.")
+        else:
+            st.markdown("Hardest questions first.")
+            st.dataframe({
+                "Lesson": [title for title, _, _, _ in accuracy],
+                "Question": [question for _, question, _, _ in accuracy],
+                "Attempts": [attempts for _, _, attempts, _ in accuracy],
+                "% Correct": [round(share * 100, 1) for _, _, _, share in accuracy],
+            }, hide_index=True, use_container_width=True)
+        
+        st.markdown("### 💯 Points Distribution")
+        distribution = data.points_distribution()
+        st.bar_chart({
+            "Points": [low for low, _, _ in distribution],
+            "Students": [count for _, _, count in distribution],
+        }, x="Points", y="Students")
+
+elif page == "📈 Metrics":
+    st.title("📈 Metrics")
+    st.caption(f"This server process (pid {os.getpid()}) since it started. "
+               "Set LEXIQ_METRICS_FILE or LEXIQ_METRICS_PORT to let Prometheus collect them.")
+    registry = metrics.REGISTRY
+    
+    st.markdown("### ⏱️ Hot Paths")
+    timers = sorted(registry.timers().items())
+    st.dataframe({
+        "Path": [name for name, _ in timers],
+        "Runs": [timer.count for _, timer in timers],
+        "Mean ms": [round(timer.total / timer.count * 1000, 2) if timer.count else 0 for _, timer in timers],
+        "p50 ms": [round(timer.percentile(50) * 1000, 2) for _, timer in timers],
+        "p99 ms": [round(timer.percentile(99) * 1000, 2) for _, timer in timers],
+        "Max ms": [round(timer.max * 1000, 2) for _, timer in timers],
+    }, hide_index=True, use_container_width=True)
+    
+    st.markdown("### 🤖 AI Calls")
+    # Read from snapshots so looking does not create empty series
+    counters, histograms = registry.counters(), registry.histograms()
+    sites = sorted({dict(labels)['site'] for name, labels in counters if name == "llm.requests"})
+    if not sites:
+        st.markdown("No AI calls yet.")
+    else:
+        def requests(site, outcome):
+            counter = counters.get(("llm.requests", (('outcome', outcome), ('site', site))))
+            return counter.value if counter else 0
+        
+        def mean(name, site):
+            h = histograms.get((name, (('site', site),)))
+            return round(h.total / h.count, 2) if h and h.count else None
+        
+        def p90(name, site):
+            h = histograms.get((name, (('site', site),)))
+            return h.quantile(0.9) if h and h.count else None
+        
+        st.dataframe({
+            "Call site": sites,
+            "OK": [requests(site, "ok") for site in sites],
+            "Cached": [requests(site, "cached") for site in sites],
+            "Failed": [requests(site, "failed") for site in sites],
+            "Mean s": [mean("llm.latency_seconds", site) for site in sites],
+            "p90 s (bucket)": [p90("llm.latency_seconds", site) for site in sites],
+            "First token s": [mean("llm.first_token_seconds", site) for site in sites],
+            "Queued s": [mean("llm.queue_wait_seconds", site) for site in sites],
+            "Prompt tokens": [mean("llm.prompt_tokens", site) for site in sites],
+            "Reply tokens": [mean("llm.completion_tokens", site) for site in sites],
+        }, hide_index=True, use_container_width=True)
+    
+    exported = registry.export()
+    with st.expander("Prometheus text"):
+        st.code(exported, language='text')
+    st.download_button("⬇️ Download metrics.prom", exported, file_name="metrics.prom", mime="text/plain")
+
+# --- TIMING ---
+page_name = page.split(" ", 1)[1].lower().replace(" ", "_")
+metrics.REGISTRY.timer(f"page.{page_name}").observe(time.perf_counter() - page_start)
+metrics.REGISTRY.timer("rerun").observe(time.perf_counter() - script_start)
@@ -0,0 +1,274 @@
+import bisect
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_WINDOW = 1000
+# Upper bounds of the LLM histograms' buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+PREFIX = "lexiq_"
+# "{pid}" in the path is replaced, so every worker process can write its own file
+EXPORT_FILE = os.environ.get("LEXIQ_METRICS_FILE")
+EXPORT_PORT = int(os.environ.get("LEXIQ_METRICS_PORT", "0")) or None
+EXPORT_INTERVAL = float(os.environ.get("LEXIQ_METRICS_INTERVAL", "15"))
+
+
+class Timer:
+    """Durations observed for one named code path, with a window for percentiles."""
+
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Counts of observed values per bucket, Prometheus style: cheap and mergeable."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        # One slot per upper bound plus one for anything larger
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        """(per-bucket counts, count, sum), read together."""
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the `q` quantile; inf past the last bucket."""
+        counts, count, _ = self.snapshot()
+        if not count:
+            return 0.0
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            if seen >= q * count:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    """Named timers, counters and histograms for one process.
+
+    Counters and histograms take labels (e.g. `site="assistant"`); each
+    label set is its own series, as in Prometheus.
+    """
+
+    def __init__(self):
+        self._timers = {}
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        with self._lock:
+            if name not in self._timers:
+                self._timers[name] = Timer()
+            return self._timers[name]
+
+    @contextlib.contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Also recorded when the block ends in st.rerun() or st.stop()
+            self.timer(name).observe(time.perf_counter() - start)
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._counters:
+                self._counters[key] = Counter()
+            return self._counters[key]
+
+    def histogram(self, name, buckets, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            return self._histograms[key]
+
+    def timers(self):
+        with self._lock:
+            return dict(self._timers)
+
+    def counters(self):
+        """{(name, labels): Counter} with labels as sorted (key, value) pairs."""
+        with self._lock:
+            return dict(self._counters)
+
+    def histograms(self):
+        with self._lock:
+            return dict(self._histograms)
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self._histograms.clear()
+
+    def export(self):
+        """Everything in the Prometheus text exposition format.
+
+        Timers become summaries in seconds (quantiles over the recent
+        window, sum and count since start), counters get a `_total` suffix
+        and histograms have cumulative `le` buckets.
+        """
+        lines = []
+        for name, timer in sorted(self.timers().items()):
+            metric = _metric_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in SUMMARY_QUANTILES:
+                lines.append(f"{metric}{_labels((), quantile=q)} {timer.percentile(q * 100):.6g}")
+            lines.append(f"{metric}_sum {timer.total:.6g}")
+            lines.append(f"{metric}_count {timer.count}")
+        declared = set()
+        for (name, labels), counter in sorted(self.counters().items()):
+            metric = _metric_name(name) + "_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {counter.value}")
+        for (name, labels), histogram in sorted(self.histograms().items()):
+            metric = _metric_name(name)
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, n in zip(histogram.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{metric}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total:.6g}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(name):
+    return PREFIX + "".join(c if c.isalnum() else "_" for c in name.lower())
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+
+# --- EXPORT ---
+class Exporter:
+    """Publishes a registry for Prometheus to scrape.
+
+    With `path` the text format is rewritten there every `interval`
+    seconds (for a node exporter textfile collector, say); with `port` it
+    is also served at http://127.0.0.1:<port>/metrics. Neither costs
+    anything on the request path: both read the registry off to the side.
+    """
+
+    def __init__(self, registry=REGISTRY, path=EXPORT_FILE, port=EXPORT_PORT, interval=EXPORT_INTERVAL):
+        self.registry = registry
+        self.path = path.replace("{pid}", str(os.getpid())) if path else None
+        self.port = port
+        self.interval = interval
+        self.server = None
+        self._thread = None
+
+    def start(self):
+        if self.path and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+            self._thread.start()
+        if self.port and self.server is None:
+            try:
+                self.server = ThreadingHTTPServer(("127.0.0.1", self.port), _handler(self.registry))
+            except OSError as e:
+                # Port taken (another worker, a stale process): carry on without the endpoint
+                print(f"metrics: not serving on port {self.port}: {e}", file=sys.stderr, flush=True)
+                self.port = None
+                return self
+            threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        return self
+
+    def write(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.registry.export())
+        os.replace(tmp, self.path)
+
+    def _run(self):
+        while True:
+            try:
+                self.write()
+            except OSError:
+                pass
+            time.sleep(self.interval)
+
+
+def _handler(registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.export().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
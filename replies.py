@@ -0,0 +1,120 @@
+import re
+
+# Section headers the tutor's system prompt asks for, e.g. "CONCEPT: ..." or "**WHY:** ..."
+HEADER = re.compile(r"^[\s*_#>-]*(CONCEPT|QUESTION|CODE_CHANGE|WHY|NEXT)[\s*_]*:[\s*_]*(.*)$")
+FENCE = "```"
+PYTHON_LANGUAGES = {"python", "py", "python3"}
+
+
+class Event:
+    """A finished piece of a reply.
+
+    `kind` is the section name in lower case. For "code_change" events
+    `text` is the code, `explanation` the reasoning that came before it and
+    `why` a WHY section that came before the code, if any. A "why" event
+    that follows a change has `change` set to that change's number in the
+    reply (from 0).
+    """
+
+    def __init__(self, kind, text, explanation=None, why=None, change=None):
+        self.kind = kind
+        self.text = text
+        self.explanation = explanation
+        self.why = why
+        self.change = change
+
+    def __repr__(self):
+        return f"Event({self.kind!r}, {self.text!r})"
+
+
+class ReplyParser:
+    """Turns a streamed tutor reply into events as each part of it closes.
+
+    Feed it the pieces of text as they arrive. Work happens a line at a
+    time, so a section is reported when the next header starts and a code
+    block when its closing fence arrives, well before the reply ends.
+    A python (or unlabelled) block under a CODE_CHANGE header is a code
+    change; code shown anywhere else is just an example. One reply can
+    suggest several changes, each with its own WHY.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._section = None
+        self._lines = []
+        self._fence = None
+        self._code = []
+        self._prose = []
+        self._changes = 0
+        # The last change still waiting for its WHY, and a WHY still waiting for its change
+        self._unexplained = None
+        self._why = None
+        self.sections = {}
+
+    def feed(self, text):
+        self._partial += text
+        *lines, self._partial = self._partial.split("\n")
+        events = []
+        for line in lines:
+            events.extend(self._line(line))
+        return events
+
+    def close(self):
+        """Finish the reply: flush the last line, an unclosed block and the open section."""
+        events = []
+        if self._partial:
+            events.extend(self._line(self._partial))
+            self._partial = ""
+        if self._fence is not None:
+            events.extend(self._end_block())
+        events.extend(self._end_section())
+        return events
+
+    def _line(self, line):
+        if self._fence is not None:
+            if line.strip().startswith(FENCE):
+                return self._end_block()
+            self._code.append(line)
+            return []
+        if line.strip().startswith(FENCE):
+            self._fence = line.strip()[len(FENCE):].strip().lower()
+            self._code = []
+            return []
+        match = HEADER.match(line)
+        if match is None:
+            self._lines.append(line)
+            self._prose.append(line)
+            return []
+        events = self._end_section()
+        self._section = match.group(1).lower()
+        self._lines = [match.group(2)]
+        self._prose.append(match.group(2))
+        return events
+
+    def _end_block(self):
+        language, self._fence = self._fence, None
+        code = "\n".join(self._code).strip()
+        if not code or self._section != "code_change" or (language and language not in PYTHON_LANGUAGES):
+            return []
+        # The concept is the best explanation; without one, whatever was said since the last block
+        explanation = self.sections.get("concept") or "\n".join(self._prose).strip()
+        self._prose = []
+        why, self._why = self._why, None
+        self._unexplained = None if why else self._changes
+        self._changes += 1
+        return [Event("code_change", code, explanation, why=why)]
+
+    def _end_section(self):
+        section, self._section = self._section, None
+        text = "\n".join(self._lines).strip()
+        self._lines = []
+        if section is None or section == "code_change" or not text:
+            return []
+        self.sections[section] = text
+        if section != "why":
+            return [Event(section, text)]
+        change, self._unexplained = self._unexplained, None
+        if change is None:
+            # Nothing to explain yet, so it belongs to the next change
+            self._why = text
+        return [Event(section, text, change=change)]
@@ -0,0 +1,436 @@
+import builtins
+import io
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing.connection import Connection
+
+try:
+    import resource
+except ImportError:  # Windows: wall-clock limit only
+    resource = None
+
+WALL_TIMEOUT = float(os.environ.get("LEXIQ_RUN_TIMEOUT", "3.0"))
+CPU_SECONDS = int(os.environ.get("LEXIQ_RUN_CPU_SECONDS", "2"))
+MEMORY_MB = int(os.environ.get("LEXIQ_RUN_MEMORY_MB", "256"))
+MAX_WORKERS = int(os.environ.get("LEXIQ_RUN_WORKERS", str(os.cpu_count() or 2)))
+POOL_SIZE = int(os.environ.get("LEXIQ_POOL_SIZE", str(os.cpu_count() or 2)))
+MAX_RUNS_PER_WORKER = int(os.environ.get("LEXIQ_POOL_MAX_RUNS", "50"))
+MAX_QUEUE = int(os.environ.get("LEXIQ_POOL_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT = float(os.environ.get("LEXIQ_POOL_QUEUE_TIMEOUT", "5.0"))
+MAX_OUTPUT = 10_000
+# Imported once per warm worker so student code does not pay for them
+PRELOAD_MODULES = ("math", "random", "string", "time", "json", "collections", "itertools", "datetime")
+
+
+TIMEOUT_OUTCOME = "TimeoutError: still running after {timeout:g}s (is there an infinite loop?)"
+KILLED_OUTCOME = "Your code used too much CPU time or memory."
+BUSY_OUTCOME = "The code runner is busy right now. Please try again in a moment."
+# How much longer than the run timeout the pool waits on a worker before giving up on it
+WORKER_GRACE = 1.0
+# Seconds between attempts to start a replacement worker that failed to start
+RESPAWN_DELAY = 1.0
+# Taken before any student code runs, so checks see the real builtins whatever the code does
+TRUSTED_BUILTINS = dict(vars(builtins))
+
+
+def clean_env():
+    """The whole environment student code gets: no API keys, database paths or tokens."""
+    env = {"PATH": os.defpath, "LANG": "C.UTF-8"}
+    if "SYSTEMROOT" in os.environ:  # Windows cannot start Python without it
+        env["SYSTEMROOT"] = os.environ["SYSTEMROOT"]
+    return env
+
+
+class Verdict:
+    def __init__(self, passed, results, output="", error=None, duration=0.0):
+        self.passed = passed
+        self.results = results
+        self.output = output
+        self.error = error
+        self.duration = duration
+
+
+def make_verdict(outcome, tests, duration):
+    results = outcome["results"] or [{"name": test["name"], "passed": False} for test in tests]
+    passed = outcome["error"] is None and bool(results) and all(r["passed"] for r in results)
+    return Verdict(passed, results, outcome["output"], outcome["error"], duration)
+
+
+# --- INSIDE THE WORKER PROCESS ---
+def apply_limits(cpu_seconds, memory_mb):
+    if resource is None:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    # Student code has no business writing files
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    limit_processes()
+
+
+def limit_processes():
+    # Nor starting processes; the process group kill catches any that slip through (e.g. as root)
+    if resource is not None and hasattr(resource, "RLIMIT_NPROC"):
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def isolate(workdir):
+    """Detach a run from the app: its own process group, a scratch cwd and a bare environment."""
+    if hasattr(os, "setsid"):
+        os.setsid()
+    os.chdir(workdir)
+    os.environ.clear()
+    os.environ.update(clean_env())
+
+
+def kill_group(pid):
+    """SIGKILL a run and everything it started."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # Not a group leader yet (killed before setsid), so only the run itself exists
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_names"):
+            names |= _names(const)
+    return names
+
+
+def check_namespace(namespace, output, check):
+    """What a check is evaluated in: the student's names, but real builtins and output.
+
+    Names the check takes from builtins (len, print, ...) are never the
+    student's versions, so redefining them cannot fake a pass.
+    """
+    trusted = _names(check) & TRUSTED_BUILTINS.keys()
+    scope = {name: value for name, value in namespace.items() if name not in trusted and not name.startswith("__")}
+    scope.update(__builtins__=dict(TRUSTED_BUILTINS), output=output)
+    return scope
+
+
+class _CappedOutput(io.StringIO):
+    def write(self, text):
+        if self.tell() < MAX_OUTPUT:
+            return super().write(text[:MAX_OUTPUT - self.tell()])
+        return len(text)
+
+
+def execute(code, tests):
+    """Run `code`, then evaluate each test's `check` expression against it.
+
+    Checks see the student's names with their printed output bound to
+    `output`, but always the real builtins (see `check_namespace`).
+    Returns a plain dict so it can cross a process boundary.
+    """
+    namespace = {"__name__": "__main__"}
+    stdout = _CappedOutput()
+    real_stdout, real_stdin = sys.stdout, sys.stdin
+    sys.stdout, sys.stdin = stdout, io.StringIO()
+    error = None
+    try:
+        exec(compile(code, "<your code>", "exec"), namespace)
+    except BaseException as e:
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+    finally:
+        sys.stdout, sys.stdin = real_stdout, real_stdin
+        # Undo any patching of builtins; the checks and the reply need the real ones
+        vars(builtins).update(TRUSTED_BUILTINS)
+
+    output = stdout.getvalue()
+    results = []
+    for test in tests:
+        if error is not None:
+            results.append({"name": test["name"], "passed": False})
+            continue
+        sys.stdout = _CappedOutput()
+        try:
+            check = compile(test["check"], "<check>", "eval")
+            passed = bool(eval(check, check_namespace(namespace, output, check)))
+        except BaseException:
+            passed = False
+        finally:
+            sys.stdout = real_stdout
+        results.append({"name": test["name"], "passed": passed})
+    return {"output": output, "error": error, "results": results}
+
+
+def _warm_worker(conn, timeout, cpu_seconds, memory_mb):
+    """A zygote: imports once, then forks a fresh child for every run.
+
+    Student code only ever runs in the child, so nothing it changes (module
+    attributes, sys.modules, the runner itself) survives into the next
+    student's run. Each child also gets its own process group, scratch
+    directory and bare environment (see `isolate`). The zygote enforces
+    the wall-clock timeout, kills the whole group afterwards and reports a
+    child that dies without answering.
+    """
+    # Finding the temp dir writes a probe file, so it has to happen before the file-size limit
+    tempfile.gettempdir()
+    if resource is not None:
+        memory = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    for name in PRELOAD_MODULES:
+        __import__(name)
+    while True:
+        try:
+            code, tests = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if not hasattr(os, "fork"):
+            # Windows: run here and retire, the pool starts a new worker for every run
+            conn.send(execute(code, tests))
+            return
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        workdir = tempfile.mkdtemp(prefix="lexiq-run-")
+        pid = os.fork()
+        if pid == 0:
+            # Drop the line back to the app before any student code runs
+            conn.close()
+            reader.close()
+            try:
+                isolate(workdir)
+                if resource is not None:
+                    # Hard limit too, so the code cannot raise it back up
+                    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+                limit_processes()
+                outcome = execute(code, tests)
+            except BaseException as e:
+                outcome = {"output": "", "error": f"{type(e).__name__}: {e}", "results": []}
+            try:
+                writer.send(outcome)
+            finally:
+                os._exit(0)
+        writer.close()
+        try:
+            if reader.poll(timeout):
+                outcome = reader.recv()
+            else:
+                outcome = {"output": "", "error": TIMEOUT_OUTCOME.format(timeout=timeout), "results": []}
+        except (EOFError, OSError):
+            # The child died without reporting, usually a resource limit
+            outcome = {"output": "", "error": KILLED_OUTCOME, "results": []}
+        finally:
+            reader.close()
+            kill_group(pid)
+            os.waitpid(pid, 0)
+            shutil.rmtree(workdir, ignore_errors=True)
+        conn.send(outcome)
+
+
+def _child(conn, code, tests, cpu_seconds, memory_mb, workdir):
+    isolate(workdir)
+    apply_limits(cpu_seconds, memory_mb)
+    try:
+        conn.send(execute(code, tests))
+    except BaseException as e:
+        conn.send({"output": "", "error": f"{type(e).__name__}: {e}", "results": []})
+    finally:
+        conn.close()
+
+
+# --- RUNNER ---
+class ExerciseRunner:
+    """Runs student code in short-lived, resource-limited worker processes.
+
+    At most `max_workers` runs execute at once; each gets a fresh process
+    with CPU, address-space, file-size and process limits, isolated as in
+    `isolate`, and its process group is killed if it is still going after
+    `timeout` seconds of wall-clock time.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, timeout=WALL_TIMEOUT, cpu_seconds=CPU_SECONDS,
+                 memory_mb=MEMORY_MB):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._slots = threading.BoundedSemaphore(max_workers)
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+
+    def run(self, code, tests=()):
+        tests = list(tests)
+        start = time.perf_counter()
+        with self._slots:
+            parent, child = self._context.Pipe(duplex=False)
+            workdir = tempfile.mkdtemp(prefix="lexiq-run-")
+            process = self._context.Process(
+                target=_child, args=(child, code, tests, self.cpu_seconds, self.memory_mb, workdir), daemon=True
+            )
+            process.start()
+            child.close()
+            try:
+                if parent.poll(self.timeout):
+                    outcome = parent.recv()
+                else:
+                    outcome = {"output": "", "error": TIMEOUT_OUTCOME.format(timeout=self.timeout), "results": []}
+            except (EOFError, OSError):
+                # The worker died without reporting, usually a resource limit
+                outcome = {"output": "", "error": KILLED_OUTCOME, "results": []}
+            finally:
+                parent.close()
+                if hasattr(os, "killpg"):
+                    kill_group(process.pid)
+                elif process.is_alive():
+                    process.kill()
+                process.join()
+                shutil.rmtree(workdir, ignore_errors=True)
+        return make_verdict(outcome, tests, time.perf_counter() - start)
+
+
+# --- WARM POOL ---
+class _Worker:
+    """A zygote started as `python runner.py worker ...`, talking over a socket.
+
+    It is a fresh interpreter rather than a multiprocessing child, so it
+    never imports the app's `__main__` (main.py under `streamlit run`).
+    """
+
+    def __init__(self, timeout, cpu_seconds, memory_mb):
+        ours, theirs = socket.socketpair()
+        # -I: ignore PYTHON* variables and user site-packages as well
+        args = [sys.executable, "-I", os.path.abspath(__file__), "worker", "-", str(timeout), str(cpu_seconds), str(memory_mb)]
+        try:
+            if os.name == "nt":
+                self.process = subprocess.Popen(args, stdin=subprocess.PIPE, env=clean_env(), cwd=tempfile.gettempdir())
+                self.process.stdin.write(theirs.share(self.process.pid))
+                self.process.stdin.close()
+            else:
+                args[4] = str(theirs.fileno())
+                self.process = subprocess.Popen(args, stdin=subprocess.DEVNULL, pass_fds=(theirs.fileno(),),
+                                                env=clean_env(), cwd=tempfile.gettempdir())
+        except BaseException:
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+        self.conn = Connection(ours.detach())
+        self.runs = 0
+
+    def stop(self):
+        self.conn.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class WarmPool:
+    """Pre-started, pre-imported interpreters that take runs off a queue.
+
+    Runs are handed to an idle worker over a pipe and the worker forks a
+    fresh child for each one, so the cost is a pickle round trip and a
+    fork rather than an interpreter start, and no run sees another's
+    state. Workers are replaced in the background after `max_runs` runs
+    or when one stops answering. At most
+    `size + max_queue` runs are admitted at once; beyond that callers wait
+    up to `queue_timeout` seconds and then get a "busy" verdict.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_runs=MAX_RUNS_PER_WORKER, max_queue=MAX_QUEUE,
+                 queue_timeout=QUEUE_TIMEOUT, timeout=WALL_TIMEOUT, cpu_seconds=CPU_SECONDS,
+                 memory_mb=MEMORY_MB):
+        self.size = size
+        # Without fork a worker cannot give each run a fresh child, so it is used once
+        self.max_runs = max_runs if hasattr(os, "fork") else 1
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.recycled = 0
+        self._admission = threading.BoundedSemaphore(size + max_queue)
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return _Worker(self.timeout, self.cpu_seconds, self.memory_mb)
+
+    def _replace(self, worker):
+        self.recycled += 1
+
+        def swap():
+            worker.stop()
+            # Keep trying, or the pool would be one worker short for good
+            while not self._closed:
+                try:
+                    self._idle.put(self._spawn())
+                    return
+                except OSError as e:
+                    print(f"runner: could not start a worker: {e}", file=sys.stderr, flush=True)
+                    time.sleep(RESPAWN_DELAY)
+        threading.Thread(target=swap, daemon=True).start()
+
+    def run(self, code, tests=()):
+        tests = list(tests)
+        start = time.perf_counter()
+        if not self._admission.acquire(timeout=self.queue_timeout):
+            return make_verdict({"output": "", "error": BUSY_OUTCOME, "results": []}, tests, 0.0)
+        try:
+            try:
+                worker = self._idle.get(timeout=self.queue_timeout)
+            except queue.Empty:
+                return make_verdict({"output": "", "error": BUSY_OUTCOME, "results": []}, tests, 0.0)
+            healthy = True
+            try:
+                worker.conn.send((code, tests))
+                # The worker times the run out itself; this only catches a stuck worker
+                if worker.conn.poll(self.timeout + WORKER_GRACE):
+                    outcome = worker.conn.recv()
+                else:
+                    outcome = {"output": "", "error": TIMEOUT_OUTCOME.format(timeout=self.timeout), "results": []}
+                    healthy = False
+            except (EOFError, OSError):
+                outcome = {"output": "", "error": KILLED_OUTCOME, "results": []}
+                healthy = False
+            worker.runs += 1
+            if healthy and worker.runs < self.max_runs:
+                self._idle.put(worker)
+            else:
+                self._replace(worker)
+        finally:
+            self._admission.release()
+        return make_verdict(outcome, tests, time.perf_counter() - start)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 5 or argv[0] != "worker":
+        print("usage: python runner.py worker <fd> <timeout> <cpu_seconds> <memory_mb>")
+        return 1
+    if argv[1] == "-":
+        # Windows: the socket arrives on stdin, shared by the pool
+        handle = socket.fromshare(sys.stdin.buffer.read()).detach()
+    else:
+        handle = int(argv[1])
+    _warm_worker(Connection(handle), float(argv[2]), int(argv[3]), int(argv[4]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+CHECK_INTERVAL = 2.0
+# Set by the proxy on the first response; names the worker holding the browser's session
+AFFINITY_COOKIE = "lexiq_worker"
+HEAD_TIMEOUT = 10.0
+HEAD_END = b"\r\n\r\n"
+
+
+class Worker:
+    """One `streamlit run` process on a private port."""
+
+    def __init__(self, index, port, run_dir, metrics_port=None):
+        self.index = index
+        self.port = port
+        self.metrics_port = metrics_port
+        self.ready_file = os.path.join(run_dir, f"worker{index}.ready")
+        self.process = None
+        self.connections = 0
+        self.healthy = False
+        self.warm = False
+
+    def start(self):
+        if os.path.exists(self.ready_file):
+            os.remove(self.ready_file)
+        self.healthy = self.warm = False
+        env = dict(os.environ, LEXIQ_READY_FILE=self.ready_file)
+        if self.metrics_port:
+            env["LEXIQ_METRICS_PORT"] = str(self.metrics_port)
+        self.process = subprocess.Popen([
+            sys.executable, "-m", "streamlit", "run", APP_PATH,
+            "--server.port", str(self.port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+        ], env=env)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class Balancer:
+    """TCP reverse proxy in front of the workers.
+
+    A Streamlit session lives in one worker's memory, so a browser has to
+    keep reaching the same worker. The proxy reads only the head of the
+    first request on each connection: a valid `lexiq_worker` cookie picks
+    the worker; otherwise the live worker with the fewest open connections
+    is chosen and the cookie is added to the first response. The rest of
+    the connection, websockets included, is passed through untouched.
+    Browsers behind one NAT address still spread across the workers.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def pick(self, pinned=None):
+        """(worker, whether the client must be told) for a connection carrying cookie `pinned`."""
+        live = [w for w in self.workers if w.alive and w.healthy]
+        for worker in live:
+            if str(worker.index) == pinned:
+                return worker, False
+        if not live:
+            return None, False
+        return min(live, key=lambda w: w.connections), True
+
+    async def handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(HEAD_END), HEAD_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        worker, tell = self.pick(_cookie(head, AFFINITY_COOKIE))
+        if worker is None:
+            writer.close()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+        except OSError:
+            writer.close()
+            return
+        worker.connections += 1
+        try:
+            upstream_writer.write(head)
+            cookie = f"Set-Cookie: {AFFINITY_COOKIE}={worker.index}; Path=/; HttpOnly; SameSite=Lax" if tell else None
+            await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer, cookie))
+        finally:
+            worker.connections -= 1
+
+
+def _cookie(head, name):
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        field, _, value = line.partition(":")
+        if field.strip().lower() != "cookie":
+            continue
+        for pair in value.split(";"):
+            key, _, cookie = pair.strip().partition("=")
+            if key == name:
+                return cookie
+    return None
+
+
+async def _pipe(reader, writer, header=None):
+    """Copy `reader` to `writer`; with `header`, add it to the first HTTP head that passes."""
+    try:
+        if header is not None:
+            head = await reader.readuntil(HEAD_END)
+            # The head ends in a blank line; the new header goes just before it
+            writer.write(head[:-2] + header.encode("latin-1") + HEAD_END)
+            await writer.drain()
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def supervise(workers):
+    """Health-check the workers and restart any that exit.
+
+    A worker takes traffic once Streamlit's health endpoint answers. Its
+    ready file appears later, when the app's warm-up has run for the first
+    session; that is only reported. A crashed worker loses its own
+    sessions, but chat and workspaces come back from the shared store when
+    those students log in again.
+    """
+    while True:
+        for worker in workers:
+            if not worker.alive:
+                print(f"worker {worker.index} exited, restarting on port {worker.port}", flush=True)
+                worker.start()
+                continue
+            healthy = await _health(worker.port)
+            if healthy != worker.healthy:
+                print(f"worker {worker.index} on port {worker.port}: {'up' if healthy else 'not responding'}",
+                      flush=True)
+                worker.healthy = healthy
+            if not worker.warm and os.path.exists(worker.ready_file):
+                worker.warm = True
+                print(f"worker {worker.index} warmed up", flush=True)
+        await asyncio.sleep(CHECK_INTERVAL)
+
+
+async def serve(args):
+    run_dir = os.path.abspath(args.run_dir)
+    os.makedirs(run_dir, exist_ok=True)
+    workers = [
+        Worker(i, args.worker_port + i, run_dir, args.metrics_port + i if args.metrics_port else None)
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    balancer = Balancer(workers)
+    server = await asyncio.start_server(balancer.handle, args.host, args.port)
+    print(f"LexIQ: {args.workers} workers behind http://{args.host}:{args.port}", flush=True)
+
+    try:
+        async with server:
+            await asyncio.gather(server.serve_forever(), supervise(workers))
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+async def _health(port):
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), CHECK_INTERVAL)
+        writer.write(b"GET /_stcore/health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), CHECK_INTERVAL)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        return False
+    return b" 200 " in status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run several LexIQ workers behind a local reverse proxy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--worker-port", type=int, default=8601, help="first worker port; the rest follow")
+    parser.add_argument("--run-dir", default=".lexiq-run", help="where workers write their ready files")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve each worker's Prometheus metrics from this port up")
+    args = parser.parse_args(argv)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
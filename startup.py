@@ -0,0 +1,66 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+READY_FILE = os.environ.get("LEXIQ_READY_FILE")
+
+
+class Warmup:
+    """Runs named preload steps in a background thread after process start.
+
+    The first page render never waits for it: anything not warmed yet is
+    simply built on first use, as before. `ready` is set once every step
+    has run, and if `ready_file` is given a small JSON report is written
+    there so a launcher or health check can tell the worker is warm.
+    """
+
+    def __init__(self, steps, ready_file=READY_FILE):
+        self.steps = steps
+        self.ready_file = ready_file
+        self.timings = {}
+        self.errors = {}
+        self.ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lexiq-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def _run(self):
+        for name, step in self.steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                # A failed preload only means that piece is built on first use instead
+                self.errors[name] = f"{type(e).__name__}: {e}"
+            self.timings[name] = time.perf_counter() - start
+        if self.ready_file:
+            self._signal()
+        self.ready.set()
+
+    def _signal(self):
+        report = {
+            "pid": os.getpid(),
+            "ready_at": time.time(),
+            "timings": self.timings,
+            "errors": self.errors,
+        }
+        tmp = f"{self.ready_file}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(report, f)
+        os.replace(tmp, self.ready_file)
+        atexit.register(self._clear)
+
+    def _clear(self):
+        try:
+            os.remove(self.ready_file)
+        except OSError:
+            pass
@@ -0,0 +1,1169 @@
+import atexit
+import glob
+import itertools
+import json
+import operator
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+import metrics
+
+DEFAULT_DB_PATH = os.environ.get("LEXIQ_DB", "lexiq.db")
+DEFAULT_BACKEND = os.environ.get("LEXIQ_STORAGE", "sqlite")
+# Where a JSON deployment kept users.json; imported the first time an empty database opens
+LEGACY_JSON_DIR = os.environ.get("LEXIQ_JSON_DIR", ".")
+DEFAULT_POOL_SIZE = int(os.environ.get("LEXIQ_DB_POOL", "8"))
+DEFAULT_FLUSH_INTERVAL = float(os.environ.get("LEXIQ_FLUSH_INTERVAL", "2.0"))
+# How long the progress writer remembers a tab that stopped marking (closed without logging out)
+DEFAULT_SESSION_TTL = float(os.environ.get("LEXIQ_SESSION_TTL", "3600"))
+TRANSCRIPT_SEGMENT = int(os.environ.get("LEXIQ_TRANSCRIPT_SEGMENT", "50"))
+# What follows "transcript_<user>_<conversation>_" in a JSON transcript segment's file name
+SEGMENT_SUFFIX = re.compile(r"\d+\.z")
+
+
+def default_progress():
+    return {
+        'completed_lessons': [],
+        'quiz_scores': {},
+        'code_submissions': [],
+        'current_streak': 0,
+        'total_points': 0,
+        'last_login': datetime.now().isoformat()
+    }
+
+
+class StateConflict(Exception):
+    """A versioned write lost to a newer one; carries the stored version and value."""
+
+    def __init__(self, name, version, value):
+        super().__init__(f"{name} is at version {version}")
+        self.name = name
+        self.version = version
+        self.value = value
+
+
+# --- STORAGE INTERFACE ---
+class Storage:
+    """Where accounts and per-user progress live.
+
+    `save_progress` takes an optional list of field names so engines that
+    store progress field-by-field only rewrite what actually changed.
+    """
+
+    def load_users(self):
+        raise NotImplementedError
+
+    def save_users(self, users):
+        raise NotImplementedError
+
+    def get_user(self, username):
+        return self.load_users().get(username)
+
+    def users_generation(self):
+        """Changes whenever the set of accounts changes; cheap to call."""
+        raise NotImplementedError
+
+    def create_user(self, username, password_hash):
+        """Add an account; returns the users generation it produced, or None if the name is taken."""
+        users = self.load_users()
+        if username in users:
+            return None
+        users[username] = password_hash
+        self.save_users(users)
+        return self.users_generation()
+
+    def load_progress(self, username):
+        raise NotImplementedError
+
+    def save_progress(self, username, progress, fields=None):
+        raise NotImplementedError
+
+    def append_event(self, username, kind, amount, ref=None):
+        """Append one progress event and return its (increasing) id."""
+        raise NotImplementedError
+
+    def events_after(self, username, after_id):
+        """Events newer than `after_id` as (id, kind, amount, ref) tuples, oldest first."""
+        raise NotImplementedError
+
+    def load_snapshot(self, username):
+        """(last_event_id, state) of the latest snapshot, or None."""
+        raise NotImplementedError
+
+    def save_snapshot(self, username, last_event_id, state, prune=False):
+        raise NotImplementedError
+
+    def all_events_after(self, after_id):
+        """(id, username, amount) for every user's events newer than `after_id`, oldest first."""
+        raise NotImplementedError
+
+    def points_by_user(self):
+        """({username: total_points} for every account, id of the newest event counted).
+
+        Points are the latest snapshot plus newer events, or the legacy
+        progress document for users without a snapshot, the same way
+        ProgressLog replays them.
+        """
+        last_event = max((event[0] for event in self.all_events_after(0)), default=0)
+        points = {}
+        for username in self.load_users():
+            snapshot = self.load_snapshot(username)
+            if snapshot is None:
+                last_id, total = 0, (self.load_progress(username) or {}).get('total_points', 0)
+            else:
+                last_id, total = snapshot[0], snapshot[1]['total_points']
+            events = [event for event in self.events_after(username, last_id) if event[0] <= last_event]
+            points[username] = total + sum(event[2] for event in events)
+        return points, last_event
+
+    def user_ranges(self, parts):
+        """Split the accounts into up to `parts` (start, stop) username ranges.
+
+        Ranges are contiguous and half-open; the first starts at None and
+        the last stops at None, so together they cover every account.
+        """
+        usernames = sorted(self.load_users())
+        bounds = sorted({usernames[len(usernames) * i // parts] for i in range(1, parts)} if usernames else ())
+        return list(zip([None] + bounds, bounds + [None]))
+
+    def iter_progress(self, start=None, stop=None):
+        """(username, progress, snapshot, events) for accounts with start <= username < stop.
+
+        `progress` is the stored document or None, `snapshot` is as from
+        load_snapshot and `events` are those after it, so the three replay
+        into the user's state. Accounts come out one at a time, ordered by
+        username; None leaves that end of the range open.
+        """
+        for username in sorted(self.load_users()):
+            if (start is not None and username < start) or (stop is not None and username >= stop):
+                continue
+            snapshot = self.load_snapshot(username)
+            events = self.events_after(username, snapshot[0] if snapshot else 0)
+            yield username, self.load_progress(username), snapshot, events
+
+    def load_state(self, username, name):
+        """(version, value) of a per-user state document; (0, None) if never written."""
+        raise NotImplementedError
+
+    def save_state(self, username, name, value, version):
+        """Write `value` if the stored version is still `version`.
+
+        Returns the new version, or raises StateConflict with what is
+        stored now if another writer got there first.
+        """
+        raise NotImplementedError
+
+    def last_segment(self, username, conversation):
+        """(segment, message_count) of a transcript's newest segment, or None."""
+        raise NotImplementedError
+
+    def load_segments(self, username, conversation, first, last):
+        """{segment: compressed data} for segments `first`..`last` inclusive."""
+        raise NotImplementedError
+
+    def save_segment(self, username, conversation, segment, count, data, expected):
+        """Write a segment if it still holds `expected` messages (0: not written yet).
+
+        Returns False when another writer changed it first.
+        """
+        raise NotImplementedError
+
+    def delete_transcript(self, username, conversation):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# --- LEGACY JSON FILES ---
+class JsonStorage(Storage):
+    """The original layout: users.json plus one progress_{username}.json each."""
+
+    def __init__(self, directory="."):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write(self, name, data):
+        tmp = self._path(name + ".tmp")
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self._path(name))
+
+    def load_users(self):
+        try:
+            with open(self._path('users.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_users(self, users):
+        self._write('users.json', users)
+
+    def users_generation(self):
+        try:
+            return os.stat(self._path('users.json')).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def load_progress(self, username):
+        try:
+            with open(self._path(f'progress_{username}.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_progress(self, username, progress, fields=None):
+        if fields is not None:
+            # A partial update still has to rewrite the whole document here
+            merged = self.load_progress(username) or {}
+            merged.update({field: progress[field] for field in fields if field in progress})
+            progress = merged
+        self._write(f'progress_{username}.json', progress)
+
+    def append_event(self, username, kind, amount, ref=None):
+        event_id = time.time_ns()
+        with open(self._path(f'events_{username}.jsonl'), 'a') as f:
+            f.write(json.dumps([event_id, kind, amount, ref]) + "\n")
+        return event_id
+
+    def events_after(self, username, after_id):
+        try:
+            with open(self._path(f'events_{username}.jsonl'), 'r') as f:
+                events = [tuple(json.loads(line)) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        return [event for event in events if event[0] > after_id]
+
+    def load_snapshot(self, username):
+        try:
+            with open(self._path(f'snapshot_{username}.json'), 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return data['last_event_id'], data['state']
+
+    def save_snapshot(self, username, last_event_id, state, prune=False):
+        self._write(f'snapshot_{username}.json', {'last_event_id': last_event_id, 'state': state})
+        if prune:
+            tail = self.events_after(username, last_event_id)
+            with open(self._path(f'events_{username}.jsonl'), 'w') as f:
+                f.writelines(json.dumps(list(event)) + "\n" for event in tail)
+
+    def all_events_after(self, after_id):
+        events = []
+        for path in glob.glob(self._path('events_*.jsonl')):
+            username = os.path.basename(path)[len('events_'):-len('.jsonl')]
+            events.extend((event[0], username, event[2]) for event in self.events_after(username, after_id))
+        return sorted(events)
+
+    def load_state(self, username, name):
+        try:
+            with open(self._path(f'state_{username}_{name}.json'), 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0, None
+        return data['version'], data['value']
+
+    def save_state(self, username, name, value, version):
+        # Checks the version but is not atomic across processes; use SQLite for more than one
+        current, stored = self.load_state(username, name)
+        if current != version:
+            raise StateConflict(name, current, stored)
+        self._write(f'state_{username}_{name}.json', {'version': version + 1, 'value': value})
+        return version + 1
+
+    def _segment_paths(self, username, conversation):
+        # Only the segment number may follow, or "a" + "project_chat" would also match user "a_project"
+        prefix = self._path(f'transcript_{username}_{conversation}_')
+        suffixes = ((path, path[len(prefix):]) for path in glob.glob(glob.escape(prefix) + '*.z'))
+        return {int(suffix[:-len('.z')]): path for path, suffix in suffixes if SEGMENT_SUFFIX.fullmatch(suffix)}
+
+    def _read_segment(self, path):
+        with open(path, 'rb') as f:
+            count, _, data = f.read().partition(b"\n")
+        return int(count), data
+
+    def last_segment(self, username, conversation):
+        paths = self._segment_paths(username, conversation)
+        if not paths:
+            return None
+        segment = max(paths)
+        return segment, self._read_segment(paths[segment])[0]
+
+    def load_segments(self, username, conversation, first, last):
+        paths = self._segment_paths(username, conversation)
+        return {segment: self._read_segment(path)[1] for segment, path in paths.items() if first <= segment <= last}
+
+    def save_segment(self, username, conversation, segment, count, data, expected):
+        path = self._path(f'transcript_{username}_{conversation}_{segment:06d}.z')
+        current = self._read_segment(path)[0] if os.path.exists(path) else 0
+        if current != expected:
+            return False
+        with open(path + ".tmp", 'wb') as f:
+            f.write(b"%d\n" % count + data)
+        os.replace(path + ".tmp", path)
+        return True
+
+    def delete_transcript(self, username, conversation):
+        for path in self._segment_paths(username, conversation).values():
+            os.remove(path)
+
+
+# --- SQLITE (WAL) ---
+class ConnectionPool:
+    """Keeps idle SQLite connections around instead of reopening per call."""
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS progress (
+    username TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (username, field)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('users_generation', 0);
+CREATE TABLE IF NOT EXISTS progress_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    ref TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_events_user ON progress_events (username, id);
+CREATE TABLE IF NOT EXISTS progress_snapshots (
+    username TEXT PRIMARY KEY,
+    last_event_id INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_state (
+    username TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (username, name)
+);
+CREATE TABLE IF NOT EXISTS transcript_segments (
+    username TEXT NOT NULL,
+    conversation TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (username, conversation, segment)
+);
+"""
+
+BUMP_USERS_GENERATION = "UPDATE meta SET value = value + 1 WHERE key = 'users_generation'"
+
+
+class SqliteStorage(Storage):
+    """Single SQLite database in WAL mode.
+
+    Progress is stored as one row per (username, field) so a points award
+    only rewrites the `total_points` row rather than the whole document.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, pool_size=DEFAULT_POOL_SIZE):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def load_users(self):
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT username, password_hash FROM users").fetchall()
+        return dict(rows)
+
+    def save_users(self, users):
+        now = datetime.now().isoformat()
+        with self.pool.connection() as conn, conn:
+            conn.executemany(
+                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+                [(name, pw, now) for name, pw in users.items()]
+            )
+            conn.execute(BUMP_USERS_GENERATION)
+
+    def users_generation(self):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'users_generation'").fetchone()
+        return row[0]
+
+    def get_user(self, username):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT password_hash FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def create_user(self, username, password_hash):
+        # The primary key makes concurrent signups for the same name safe
+        with self.pool.connection() as conn, conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                (username, password_hash, datetime.now().isoformat())
+            )
+            if cur.rowcount != 1:
+                return None
+            conn.execute(BUMP_USERS_GENERATION)
+            # Read back inside the same transaction, so it is our insert's generation
+            return conn.execute("SELECT value FROM meta WHERE key = 'users_generation'").fetchone()[0]
+
+    def load_progress(self, username):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT field, value FROM progress WHERE username = ?", (username,)
+            ).fetchall()
+        if not rows:
+            return None
+        return {field: json.loads(value) for field, value in rows}
+
+    def save_progress(self, username, progress, fields=None):
+        if fields is None:
+            fields = progress.keys()
+        rows = [(username, field, json.dumps(progress[field])) for field in fields if field in progress]
+        if not rows:
+            return
+        with self.pool.connection() as conn, conn:
+            conn.executemany(
+                "INSERT INTO progress (username, field, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(username, field) DO UPDATE SET value = excluded.value",
+                rows
+            )
+
+    def append_event(self, username, kind, amount, ref=None):
+        with self.pool.connection() as conn, conn:
+            cur = conn.execute(
+                "INSERT INTO progress_events (username, kind, amount, ref, created_at) VALUES (?, ?, ?, ?, ?)",
+                (username, kind, amount, ref, datetime.now().isoformat())
+            )
+        return cur.lastrowid
+
+    def events_after(self, username, after_id):
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT id, kind, amount, ref FROM progress_events WHERE username = ? AND id > ? ORDER BY id",
+                (username, after_id)
+            ).fetchall()
+
+    def load_snapshot(self, username):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT last_event_id, state FROM progress_snapshots WHERE username = ?", (username,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def save_snapshot(self, username, last_event_id, state, prune=False):
+        with self.pool.connection() as conn, conn:
+            conn.execute(
+                "INSERT INTO progress_snapshots (username, last_event_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET last_event_id = excluded.last_event_id, state = excluded.state",
+                (username, last_event_id, json.dumps(state))
+            )
+            if prune:
+                conn.execute(
+                    "DELETE FROM progress_events WHERE username = ? AND id <= ?", (username, last_event_id)
+                )
+
+    def all_events_after(self, after_id):
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT id, username, amount FROM progress_events WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+
+    def points_by_user(self):
+        # One read transaction, so the totals and the event id agree
+        with self.pool.connection() as conn, conn:
+            conn.execute("BEGIN")
+            last_event = conn.execute("SELECT COALESCE(MAX(id), 0) FROM progress_events").fetchone()[0]
+            legacy = dict(conn.execute(
+                "SELECT username, value FROM progress WHERE field = 'total_points'"
+            ).fetchall())
+            snapshots = {
+                username: json.loads(state)['total_points']
+                for username, state in conn.execute("SELECT username, state FROM progress_snapshots")
+            }
+            newer = dict(conn.execute(
+                "SELECT e.username, SUM(e.amount) FROM progress_events e "
+                "LEFT JOIN progress_snapshots s ON s.username = e.username "
+                "WHERE e.id > COALESCE(s.last_event_id, 0) AND e.id <= ? GROUP BY e.username",
+                (last_event,)
+            ).fetchall())
+            users = [row[0] for row in conn.execute("SELECT username FROM users")]
+        points = {}
+        for username in users:
+            if username in snapshots:
+                total = snapshots[username]
+            else:
+                total = json.loads(legacy[username]) if username in legacy else 0
+            points[username] = total + (newer.get(username) or 0)
+        return points, last_event
+
+    def user_ranges(self, parts):
+        with self.pool.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            bounds = set()
+            for i in range(1, parts):
+                row = conn.execute(
+                    "SELECT username FROM users ORDER BY username LIMIT 1 OFFSET ?", (count * i // parts,)
+                ).fetchone()
+                if row is not None:
+                    bounds.add(row[0])
+        bounds = sorted(bounds)
+        return list(zip([None] + bounds, bounds + [None]))
+
+    def iter_progress(self, start=None, stop=None):
+        # Three scans of a username range, each in primary key order, merged
+        # by username in one read transaction
+        def between(column):
+            clause, params = f"{column} >= ?", [start or ""]
+            if stop is not None:
+                clause += f" AND {column} < ?"
+                params.append(stop)
+            return clause, params
+
+        with self.pool.connection() as conn, conn:
+            conn.execute("BEGIN")
+            clause, params = between("u.username")
+            users = conn.execute(
+                "SELECT u.username, s.last_event_id, s.state FROM users u "
+                f"LEFT JOIN progress_snapshots s ON s.username = u.username WHERE {clause} ORDER BY u.username",
+                params
+            )
+            clause, params = between("username")
+            fields = conn.execute(
+                f"SELECT username, field, value FROM progress WHERE {clause} ORDER BY username", params
+            )
+            clause, params = between("e.username")
+            events = conn.execute(
+                "SELECT e.username, e.id, e.kind, e.amount, e.ref FROM progress_events e "
+                "LEFT JOIN progress_snapshots s ON s.username = e.username "
+                f"WHERE {clause} AND e.id > COALESCE(s.last_event_id, 0) ORDER BY e.username, e.id",
+                params
+            )
+            for (username, last_id, state), (rows, tail) in _join_by_user(users, fields, events):
+                progress = {field: json.loads(value) for _, field, value in rows} if rows else None
+                snapshot = (last_id, json.loads(state)) if state is not None else None
+                yield username, progress, snapshot, [event[1:] for event in tail]
+
+    def load_state(self, username, name):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version, value FROM user_state WHERE username = ? AND name = ?", (username, name)
+            ).fetchone()
+        if row is None:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def save_state(self, username, name, value, version):
+        encoded, now = json.dumps(value), datetime.now().isoformat()
+        with self.pool.connection() as conn, conn:
+            # Compare-and-swap: the row only changes if nobody wrote since `version`
+            if version == 0:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO user_state (username, name, version, value, updated_at) "
+                    "VALUES (?, ?, 1, ?, ?)",
+                    (username, name, encoded, now)
+                )
+            else:
+                cur = conn.execute(
+                    "UPDATE user_state SET version = version + 1, value = ?, updated_at = ? "
+                    "WHERE username = ? AND name = ? AND version = ?",
+                    (encoded, now, username, name, version)
+                )
+        if cur.rowcount != 1:
+            raise StateConflict(name, *self.load_state(username, name))
+        return version + 1
+
+    def last_segment(self, username, conversation):
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT segment, messages FROM transcript_segments WHERE username = ? AND conversation = ? "
+                "ORDER BY segment DESC LIMIT 1",
+                (username, conversation)
+            ).fetchone()
+
+    def load_segments(self, username, conversation, first, last):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT segment, data FROM transcript_segments "
+                "WHERE username = ? AND conversation = ? AND segment BETWEEN ? AND ?",
+                (username, conversation, first, last)
+            ).fetchall()
+        return dict(rows)
+
+    def save_segment(self, username, conversation, segment, count, data, expected):
+        with self.pool.connection() as conn, conn:
+            if expected == 0:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO transcript_segments (username, conversation, segment, messages, data) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (username, conversation, segment, count, data)
+                )
+            else:
+                cur = conn.execute(
+                    "UPDATE transcript_segments SET messages = ?, data = ? "
+                    "WHERE username = ? AND conversation = ? AND segment = ? AND messages = ?",
+                    (count, data, username, conversation, segment, expected)
+                )
+        return cur.rowcount == 1
+
+    def delete_transcript(self, username, conversation):
+        with self.pool.connection() as conn, conn:
+            conn.execute(
+                "DELETE FROM transcript_segments WHERE username = ? AND conversation = ?", (username, conversation)
+            )
+
+    def close(self):
+        self.pool.close()
+
+
+def _join_by_user(users, *streams):
+    """Pair each row of `users` with every stream's rows for that user.
+
+    All inputs are ordered by username, their first column, so this is a
+    merge join that holds one user's rows at a time.
+    """
+    groups = [itertools.groupby(stream, key=operator.itemgetter(0)) for stream in streams]
+    heads = [next(group, None) for group in groups]
+    for user in users:
+        matched = []
+        for i, group in enumerate(groups):
+            while heads[i] is not None and heads[i][0] < user[0]:
+                heads[i] = next(group, None)
+            if heads[i] is not None and heads[i][0] == user[0]:
+                matched.append(list(heads[i][1]))
+                heads[i] = next(group, None)
+            else:
+                matched.append([])
+        yield user, matched
+
+
+def open_storage(backend=DEFAULT_BACKEND, location=None):
+    if backend == "json":
+        return JsonStorage(location or ".")
+    if backend == "sqlite":
+        store = SqliteStorage(location or DEFAULT_DB_PATH)
+        # A database that never had an account, next to a JSON deployment, is an upgrade
+        if store.users_generation() == 0 and os.path.exists(os.path.join(LEGACY_JSON_DIR, 'users.json')):
+            migrate_json(store, LEGACY_JSON_DIR)
+        return store
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+# --- USER DIRECTORY CACHE ---
+class UserDirectory:
+    """In-memory username -> password hash index shared by every session.
+
+    Each lookup compares the store's users generation with the one the
+    index was built from and only re-reads the accounts when it moved, so
+    a login is a dict lookup plus one cheap generation check.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._users = {}
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        generation = self.store.users_generation()
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    self._users = self.store.load_users()
+                    self._generation = generation
+
+    def get(self, username):
+        self._refresh()
+        return self._users.get(username)
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        self._refresh()
+        return len(self._users)
+
+    def create(self, username, password_hash):
+        self._refresh()
+        with self._lock:
+            generation = self.store.create_user(username, password_hash)
+            if generation is None:
+                return False
+            if self._generation is not None and generation == self._generation + 1:
+                # Ours was the only change since the index was built, so patch it in place
+                self._users[username] = password_hash
+                self._generation = generation
+            else:
+                # Someone else changed the accounts too; rebuild on the next lookup
+                self._generation = None
+        return True
+
+
+# --- SHARED SESSION STATE ---
+class SharedState:
+    """Working state that outlives a session: chat transcripts and workspaces.
+
+    Each group of session keys is one versioned document in the store, so
+    whichever server process a student lands on can restore it at login.
+    `sync` only writes groups whose content changed, based on the version
+    this session last saw. If another process or tab wrote in between, the
+    stored copy wins and is loaded into the session instead.
+    """
+
+    def __init__(self, store, groups):
+        self.store = store
+        self.groups = groups
+
+    def restore(self, username, session):
+        versions, saved = {}, {}
+        for name, keys in self.groups.items():
+            versions[name], value = self.store.load_state(username, name)
+            self._apply(session, keys, value)
+            saved[name] = json.dumps(value, sort_keys=True) if value else None
+        session['shared_versions'] = versions
+        session['shared_saved'] = saved
+
+    def sync(self, username, session):
+        """Save changed groups; returns the names that were replaced by a newer copy."""
+        versions, saved = session['shared_versions'], session['shared_saved']
+        replaced = []
+        for name, keys in self.groups.items():
+            value = {key: session[key] for key in keys if key in session}
+            encoded = json.dumps(value, sort_keys=True)
+            if not value or encoded == saved.get(name):
+                continue
+            try:
+                versions[name] = self.store.save_state(username, name, value, versions.get(name, 0))
+                saved[name] = encoded
+            except StateConflict as conflict:
+                self._apply(session, keys, conflict.value)
+                versions[name] = conflict.version
+                saved[name] = json.dumps(conflict.value, sort_keys=True)
+                replaced.append(name)
+        return replaced
+
+    def forget(self, session):
+        """Drop this user's state from the session, e.g. on logout."""
+        for keys in self.groups.values():
+            for key in keys:
+                if key in session:
+                    del session[key]
+        for key in ('shared_versions', 'shared_saved'):
+            if key in session:
+                del session[key]
+
+    @staticmethod
+    def _apply(session, keys, value):
+        for key in keys:
+            if value and key in value:
+                session[key] = value[key]
+
+
+# --- CHAT TRANSCRIPTS ---
+class Transcript(list):
+    """The loaded tail of a stored conversation; used as the message list itself.
+
+    `start` is the index of the first loaded message in the whole
+    conversation and `saved` how many loaded messages are already stored.
+    Appends are persisted by `TranscriptStore.sync`; replacing the list in
+    the session with a plain one starts the conversation over.
+    """
+
+    def __init__(self, messages=(), start=0, saved=None):
+        super().__init__(messages)
+        self.start = start
+        self.saved = len(self) if saved is None else saved
+        # How many of the newest messages the UI is showing; they are never trimmed
+        self.pinned = 0
+
+    @property
+    def total(self):
+        return self.start + len(self)
+
+
+class TranscriptStore:
+    """Conversations stored as zlib-compressed JSON segments of `segment_size` messages.
+
+    Only the newest segment is rewritten as messages arrive; full segments
+    are never touched again. A session keeps the last `window_segments`
+    segments in memory and pages older ones in on demand, so neither the
+    session nor a rerun grows with the length of the conversation. Segment
+    writes are compare-and-swap on the message count, so two tabs or
+    processes appending at once do not overwrite each other.
+    """
+
+    def __init__(self, store, conversations, segment_size=TRANSCRIPT_SEGMENT, window_segments=2):
+        self.store = store
+        # Session key -> conversation name
+        self.conversations = conversations
+        self.segment_size = segment_size
+        self.window_segments = window_segments
+
+    def _decode(self, data):
+        return json.loads(zlib.decompress(data))
+
+    def _encode(self, messages):
+        return zlib.compress(json.dumps(messages).encode(), 6)
+
+    def load(self, username, conversation):
+        last = self.store.last_segment(username, conversation)
+        if last is None:
+            return Transcript()
+        first = max(0, last[0] - self.window_segments + 1)
+        segments = self.store.load_segments(username, conversation, first, last[0])
+        messages = [m for segment in sorted(segments) for m in self._decode(segments[segment])]
+        return Transcript(messages, start=first * self.segment_size)
+
+    def load_older(self, username, conversation, transcript):
+        """Prepend the previous segment; returns False at the start of the conversation."""
+        if transcript.start == 0:
+            return False
+        segment = transcript.start // self.segment_size - 1
+        data = self.store.load_segments(username, conversation, segment, segment).get(segment)
+        older = self._decode(data) if data else []
+        transcript[:0] = older
+        transcript.start -= self.segment_size
+        transcript.saved += len(older)
+        return True
+
+    def save(self, username, conversation, messages):
+        """Store what is new in `messages`; returns the Transcript to keep in the session.
+
+        Returns None if another writer got there first; the caller should
+        load the conversation again.
+        """
+        if not isinstance(messages, Transcript):
+            self.store.delete_transcript(username, conversation)
+            messages = Transcript(messages, saved=0)
+        if messages.saved == len(messages):
+            return messages
+
+        size = self.segment_size
+        first = (messages.start + messages.saved) // size
+        last = (messages.total - 1) // size
+        for segment in range(first, last + 1):
+            lo = segment * size - messages.start
+            chunk = messages[lo:lo + size]
+            expected = min(max(messages.saved - lo, 0), size)
+            if not self.store.save_segment(username, conversation, segment, len(chunk), self._encode(chunk), expected):
+                return None
+            messages.saved = lo + len(chunk)
+        self._trim(messages)
+        return messages
+
+    def _trim(self, transcript):
+        keep = max(transcript.pinned, self.window_segments * self.segment_size)
+        while len(transcript) - self.segment_size >= keep:
+            del transcript[:self.segment_size]
+            transcript.start += self.segment_size
+            transcript.saved -= self.segment_size
+
+    def restore(self, username, session):
+        for key, conversation in self.conversations.items():
+            session[key] = self.load(username, conversation)
+
+    def sync(self, username, session):
+        """Save every conversation in the session; returns those reloaded after a conflict."""
+        replaced = []
+        for key, conversation in self.conversations.items():
+            if key not in session:
+                continue
+            transcript = self.save(username, conversation, session[key])
+            if transcript is None:
+                transcript = self.load(username, conversation)
+                replaced.append(conversation)
+            session[key] = transcript
+        return replaced
+
+    def forget(self, session):
+        for key in self.conversations:
+            if key in session:
+                del session[key]
+
+
+# --- WRITE-BEHIND PROGRESS ---
+class ProgressWriter:
+    """Write-behind buffer in front of `Storage.save_progress`.
+
+    `mark` is cheap enough to call on every rerun: it compares each field
+    against what this session last handed to the writer and queues only
+    the fields that changed. What was seen is kept per session, so a tab
+    that did not touch a field never writes its stale copy over another
+    tab's change. A background thread flushes a user once their changes
+    have been quiet for `interval` seconds (or after `max_delay` at most),
+    and forgets sessions that have not marked anything for `session_ttl`.
+    """
+
+    def __init__(self, store, interval=DEFAULT_FLUSH_INTERVAL, max_delay=None, session_ttl=DEFAULT_SESSION_TTL):
+        self.store = store
+        self.interval = interval
+        self.max_delay = max_delay if max_delay is not None else interval * 5
+        self.session_ttl = session_ttl
+        self.writes = 0
+        self._seen = {}
+        self._touched = {}
+        self._pending = {}
+        self._due = {}
+        self._deadline = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def track(self, username, stored, session=None):
+        """Record the fields `stored` holds as already persisted, e.g. what `load_progress` returned.
+
+        Fields it lacks count as unsaved, so the first `mark` writes them.
+        """
+        encoded = {field: json.dumps(value, sort_keys=True) for field, value in (stored or {}).items()}
+        with self._lock:
+            self._seen[(username, session)] = encoded
+            self._touched[(username, session)] = time.monotonic()
+        self._start()
+
+    def mark(self, username, progress, session=None):
+        """Queue whichever fields of `progress` differ from this session's last mark."""
+        changed = {}
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.setdefault((username, session), {})
+            self._touched[(username, session)] = now
+            for field, value in progress.items():
+                if field == 'last_login' or field in EVENT_FIELDS:
+                    continue
+                encoded = json.dumps(value, sort_keys=True)
+                if seen.get(field) != encoded:
+                    seen[field] = encoded
+                    # Store a detached copy so the session can keep mutating its own
+                    changed[field] = json.loads(encoded)
+            if not changed:
+                return set()
+            self._pending.setdefault(username, {}).update(changed)
+            self._deadline.setdefault(username, now + self.max_delay)
+            self._due[username] = min(now + self.interval, self._deadline[username])
+        self._start()
+        return set(changed)
+
+    def flush(self, username=None):
+        with self._lock:
+            names = [username] if username is not None else list(self._pending)
+            batches = [(name, self._pending.pop(name)) for name in names if name in self._pending]
+            for name, _ in batches:
+                self._due.pop(name, None)
+                self._deadline.pop(name, None)
+        for name, fields in batches:
+            fields['last_login'] = datetime.now().isoformat()
+            with metrics.REGISTRY.time("progress.flush"):
+                self.store.save_progress(name, fields, list(fields))
+            self.writes += 1
+
+    def forget(self, username, session=None):
+        """Drop a session's view of the document, e.g. at logout (after a final mark)."""
+        with self._lock:
+            self._seen.pop((username, session), None)
+            self._touched.pop((username, session), None)
+
+    def evict(self, now=None):
+        """Forget sessions idle for longer than `session_ttl`; returns how many."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [key for key, touched in self._touched.items() if now - touched > self.session_ttl]
+            for key in idle:
+                self._seen.pop(key, None)
+                del self._touched[key]
+        return len(idle)
+
+    def _start(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval / 2)
+            now = time.monotonic()
+            with self._lock:
+                ready = [name for name, due in self._due.items() if due <= now]
+            for name in ready:
+                self.flush(name)
+            self.evict(now)
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+
+# --- PROGRESS EVENT LOG ---
+# Fields owned by the event log rather than saved as part of the document
+EVENT_FIELDS = ('total_points', 'completed_lessons')
+
+
+def apply_event(state, kind, amount, ref=None):
+    state['total_points'] += amount
+    if ref is not None and ref not in state['completed_lessons']:
+        state['completed_lessons'].append(ref)
+
+
+def replay_state(base, snapshot, events):
+    """Event-owned fields from a snapshot, or a legacy document `base`, plus newer events."""
+    if snapshot is None:
+        # No snapshot yet: legacy documents supply the starting values
+        base = base or {}
+        state = {
+            'total_points': base.get('total_points', 0),
+            'completed_lessons': list(base.get('completed_lessons', [])),
+        }
+    else:
+        state = snapshot[1]
+    for _, kind, amount, ref in events:
+        apply_event(state, kind, amount, ref)
+    return state
+
+
+class ProgressLog:
+    """Append-only log of points awards and completions.
+
+    Every award is a single small insert. After `snapshot_every` events the
+    user's state is folded into a snapshot, so loading a user replays at
+    most that many events on top of it. With `prune` the folded events are
+    deleted; by default they are kept as history for replay and analytics.
+    """
+
+    def __init__(self, store, snapshot_every=50, prune=False):
+        self.store = store
+        self.snapshot_every = snapshot_every
+        self.prune = prune
+        self._tail = {}
+        self._lock = threading.Lock()
+
+    def _replay(self, username, base=None):
+        snapshot = self.store.load_snapshot(username)
+        last_id = snapshot[0] if snapshot else 0
+        events = self.store.events_after(username, last_id)
+        state = replay_state(base, snapshot, events)
+        if events:
+            last_id = events[-1][0]
+        return last_id, state, len(events)
+
+    def load(self, username, progress):
+        """Fill the event-owned fields of `progress` from snapshot + tail."""
+        seeded = self.store.load_snapshot(username) is not None
+        last_id, state, tail = self._replay(username, progress)
+        if tail >= self.snapshot_every or not seeded:
+            self.store.save_snapshot(username, last_id, state, self.prune)
+            tail = 0
+        with self._lock:
+            self._tail[username] = tail
+        progress.update(state)
+        return progress
+
+    def record(self, username, kind, amount, ref=None):
+        self.store.append_event(username, kind, amount, ref)
+        with self._lock:
+            tail = self._tail.get(username, 0) + 1
+            self._tail[username] = tail
+        if tail >= self.snapshot_every:
+            self.compact(username)
+
+    def compact(self, username):
+        last_id, state, _ = self._replay(username)
+        self.store.save_snapshot(username, last_id, state, self.prune)
+        with self._lock:
+            self._tail[username] = 0
+
+    def history(self, username):
+        return self.store.events_after(username, 0)
+
+
+# --- JSON -> SQLITE MIGRATION ---
+def migrate_json(target, directory="."):
+    """Import users.json and every progress_*.json into `target`.
+
+    Existing accounts in the target are left alone, so running it twice is
+    harmless. Returns (users_imported, progress_files_imported).
+    """
+    source = JsonStorage(directory)
+    users_imported = sum(
+        1 for name, pw in source.load_users().items() if target.create_user(name, pw) is not None
+    )
+
+    progress_imported = 0
+    for path in sorted(glob.glob(os.path.join(directory, 'progress_*.json'))):
+        username = os.path.basename(path)[len('progress_'):-len('.json')]
+        if target.load_progress(username) is not None:
+            continue
+        progress = source.load_progress(username)
+        if progress is not None:
+            target.save_progress(username, progress)
+            progress_imported += 1
+
+    return users_imported, progress_imported
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python storage.py migrate [json_dir] [db_path]")
+        sys.exit(1)
+    json_dir = sys.argv[2] if len(sys.argv) > 2 else "."
+    db_path = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_DB_PATH
+    target = SqliteStorage(db_path)
+    users, progress = migrate_json(target, json_dir)
+    target.close()
+    print(f"Imported {users} users and {progress} progress files into {db_path}")
@@ -0,0 +1,57 @@
+import pytest
+
+from analysis import analyze, findings_message
+
+
+def kinds(code):
+    return [(finding.kind, finding.line) for finding in analyze(code)]
+
+
+@pytest.mark.parametrize("code, expected", [
+    # Missing colon
+    ("if x > 3\n    print(x)", [("syntax", 1)]),
+    # Unclosed bracket
+    ("total = (1 + 2\nprint(total)", [("syntax", 1)]),
+    # Body not indented
+    ("for i in range(3):\nprint(i)", [("indentation", 2)]),
+    # Stray indent
+    ("x = 1\n    y = 2", [("indentation", 2)]),
+    # Typo in a name
+    ("count = 0\nprint(cuont)", [("undefined", 2)]),
+    # Used before it is ever assigned anywhere
+    ("print(total)\nfor n in [1, 2]:\n    print(n)", [("undefined", 1)]),
+    # while True without a break
+    ("while True:\n    print('again')", [("endless_loop", 1)]),
+    # Counter never changes
+    ("i = 0\nwhile i < 5:\n    print(i)", [("endless_loop", 2)]),
+])
+def test_beginner_mistakes(code, expected):
+    assert kinds(code) == expected
+
+
+@pytest.mark.parametrize("code", [
+    "i = 0\nwhile i < 5:\n    i += 1",
+    "while True:\n    if input() == 'q':\n        break",
+    "items = [3]\nwhile items:\n    items.pop()",
+    "def area(width, height):\n    return width * height\nprint(area(2, 3), len('ab'))",
+    "import math\nfrom os import path\nprint(math.pi, path.sep)",
+    "try:\n    int('x')\nexcept ValueError as error:\n    print(error)",
+    "squares = [n * n for n in range(3)]\nprint(squares)",
+    "from math import *\nprint(sqrt(4))",
+])
+def test_correct_code_has_no_findings(code):
+    assert analyze(code) == ()
+
+
+def test_inner_break_does_not_end_the_outer_loop():
+    code = "while True:\n    for n in range(3):\n        break"
+    assert kinds(code) == [("endless_loop", 1)]
+
+
+def test_each_undefined_name_is_reported_once():
+    assert kinds("print(nme)\nprint(nme)") == [("undefined", 1)]
+
+
+def test_message_lists_every_finding():
+    message = findings_message(analyze("print(a)\nprint(b)"))
+    assert "`a`" in message and "`b`" in message
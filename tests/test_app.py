@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+import streamlit as st
+from curriculum import CURRICULUM
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+LESSON = next(iter(CURRICULUM.values()))["lessons"][0]["id"]
+SOLUTION = 'name = "Ada"\nage = 36\nprint(name)\nprint(age)\nprint(age + 1)\n'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Every store the app opens is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    yield AppTest.from_file(APP, default_timeout=30).run()
+    st.cache_resource.clear()
+
+
+def click(at, label):
+    next(b for b in [*at.button, *at.sidebar.button] if label in b.label).click().run()
+
+
+def sign_up(at, username, password):
+    at.text_input(key="signup_user").input(username)
+    at.text_input(key="signup_pass").input(password)
+    at.text_input(key="signup_confirm").input(password)
+    click(at, "Create Account")
+
+
+def log_in(at, username, password):
+    at.text_input(key="login_user").input(username)
+    at.text_input(key="login_pass").input(password)
+    click(at, "Login")
+
+
+def test_new_account_round_trip(app):
+    sign_up(app, "alice", "secret1")
+    log_in(app, "alice", "secret1")
+    assert not app.exception
+
+    open_lesson(app)
+    app.button(key=f"submit_{LESSON}_0").click().run()
+    click(app, "Logout")
+
+    log_in(app, "alice", "secret1")
+    assert not app.exception
+    progress = app.session_state.user_progress
+    assert progress["quiz_scores"][LESSON]["0"][0] == 1
+    assert progress["current_streak"] == 0 and progress["code_submissions"] == []
+    for page in ("📊 Progress", "🏠 Home"):
+        app.sidebar.radio[0].set_value(page).run()
+        assert not app.exception
+
+
+def open_lesson(at):
+    at.sidebar.radio[0].set_value("📚 Learn").run()
+    at.button(key=f"open_{LESSON}").click().run()
+
+
+def test_run_and_check_passes(app):
+    sign_up(app, "bob", "secret1")
+    log_in(app, "bob", "secret1")
+    open_lesson(app)
+    app.text_area(key="exercise_code").input(SOLUTION)
+    click(app, "Run & Check")
+    assert not app.exception
+    assert any("All checks passed" in message.value for message in app.success)
+
+
+def test_chat_without_api_key_asks_for_one(app):
+    sign_up(app, "carol", "secret1")
+    log_in(app, "carol", "secret1")
+    app.sidebar.radio[0].set_value("🤖 AI Assistant").run()
+    app.chat_input[0].set_value("What is a loop?").run()
+    assert not app.exception
+    assert "Groq API key" in app.session_state.chat_history[-1]["content"]
+
+
+def test_lesson_hints_come_from_the_bank(app):
+    sign_up(app, "dave", "secret1")
+    log_in(app, "dave", "secret1")
+    open_lesson(app)
+    click(app, "Get a Hint")
+    assert not app.exception
+    assert any("Hint 1: What does the = sign do" in message.value for message in app.info)
@@ -0,0 +1,58 @@
+from context import ContextBuilder, sync_message
+
+CODE = """def greet(name):
+    return 'Hello, ' + name
+
+
+def shout(text):
+    return text.upper() + '!'
+
+
+def repeat(text, times):
+    return ' '.join([text] * times)
+
+
+print(greet('Ada'))
+print(shout(greet('Ada')))
+print(repeat('hip', 2), 'hooray')
+"""
+
+
+def chat(history, text):
+    history.append({"role": "user", "content": text})
+    history.append({"role": "assistant", "content": "Good question, think about what each line does."})
+
+
+def test_short_history_is_sent_verbatim():
+    history = [sync_message([], CODE)]
+    chat(history, "why does greet need a return?")
+    built = ContextBuilder().build(history, CODE)
+    assert len(built.messages) == 3 and CODE.strip() in built.messages[0]["content"]
+
+
+def test_evicted_snapshot_is_resent():
+    history = [sync_message([], CODE)]
+    for turn in range(400):
+        chat(history, f"question {turn} about loops and lists and how they work")
+    # The code has not changed, so there is nothing new to sync
+    assert sync_message(history, CODE) is None
+
+    built = ContextBuilder(budget=500).build(history, CODE)
+    assert "return 'Hello, ' + name" in "\n".join(m["content"] for m in built.messages)
+    assert built.messages[0]["role"] == "system"
+    assert built.tokens <= 500
+
+
+def test_diffs_without_their_snapshot_become_a_snapshot():
+    history = [sync_message([], CODE)]
+    for turn in range(200):
+        chat(history, f"question {turn} about loops and lists and how they work")
+    edited = CODE.replace("hip", "hey")
+    history.append(sync_message(history, edited))
+    assert history[-1]["code_sync"] == "diff"
+    chat(history, "does it say hey now?")
+
+    built = ContextBuilder(budget=500).build(history, edited)
+    text = "\n".join(m["content"] for m in built.messages)
+    assert "print(repeat('hey', 2), 'hooray')" in text and "```diff" not in text
+    assert built.tokens <= 500
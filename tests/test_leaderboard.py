@@ -0,0 +1,40 @@
+import storage
+from leaderboard import Leaderboard, LiveLeaderboard
+
+
+def test_ties_share_a_rank():
+    board = Leaderboard({"ada": 30, "bob": 20, "cy": 20, "dee": 10})
+    assert board.top(4) == [(1, "ada", 30), (2, "bob", 20), (2, "cy", 20), (4, "dee", 10)]
+    assert [board.rank(name) for name in ("ada", "bob", "cy", "dee")] == [1, 2, 2, 4]
+    assert board.rank("nobody") is None
+
+
+def test_awards_move_users():
+    board = Leaderboard({"ada": 30, "bob": 20})
+    board.add("bob", 15)
+    board.add("cy", 5)
+    assert board.top(2) == [(1, "bob", 35), (2, "ada", 30)]
+    assert board.rank("cy") == 3 and len(board) == 3
+
+
+def test_rank_within_a_class():
+    board = Leaderboard({"ada": 30, "bob": 20, "cy": 10})
+    roster = ["bob", "cy", "newcomer"]
+    assert board.rank("cy", among=roster) == 2
+    assert board.top(5, among=roster) == [(1, "bob", 20), (2, "cy", 10), (3, "newcomer", 0)]
+
+
+def test_live_board_follows_the_event_log(tmp_path):
+    store = storage.open_storage("sqlite", str(tmp_path / "lexiq.db"))
+    for name in ("ada", "bob"):
+        store.create_user(name, "hash")
+    store.save_progress("bob", dict(storage.default_progress(), total_points=25))
+    board = LiveLeaderboard(store, refresh_interval=0)
+    assert board.top() == [(1, "bob", 25), (2, "ada", 0)]
+
+    # Awarded by another process, straight into the log
+    log = storage.ProgressLog(store)
+    log.load("ada", storage.default_progress())
+    log.record("ada", "lesson", 40, "variables")
+    assert board.rank("ada") == 1 and board.rank("bob") == 2
+    store.close()
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from replies import ReplyParser
+
+REPLY = """CONCEPT: A loop repeats a block for each item.
+```python
+for letter in "abc":
+    print(letter)
+```
+
+**CODE_CHANGE:**
+```python
+for i in range(3):
+    print(i)
+```
+WHY: range(3) gives 0, 1 and 2.
+
+WHY: Printing inside the loop shows every value.
+CODE_CHANGE:
+```
+total = sum(range(3))
+```
+QUESTION: What does range(5) give?
+NEXT: Try changing the 3."""
+
+
+def events(chunks):
+    parser = ReplyParser()
+    found = []
+    for chunk in chunks:
+        found.extend(parser.feed(chunk))
+    found.extend(parser.close())
+    return [(e.kind, e.text, e.explanation, e.why, e.change) for e in found]
+
+
+def split(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randrange(1, 40)))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_whole_reply():
+    assert events([REPLY]) == [
+        ("concept", "A loop repeats a block for each item.", None, None, None),
+        ("code_change", "for i in range(3):\n    print(i)", "A loop repeats a block for each item.", None, None),
+        ("why", "range(3) gives 0, 1 and 2.", None, None, 0),
+        ("why", "Printing inside the loop shows every value.", None, None, None),
+        ("code_change", "total = sum(range(3))", "A loop repeats a block for each item.",
+         "Printing inside the loop shows every value.", None),
+        ("question", "What does range(5) give?", None, None, None),
+        ("next", "Try changing the 3.", None, None, None),
+    ]
+
+
+def test_character_at_a_time():
+    assert events(REPLY) == events([REPLY])
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_any_chunking(seed):
+    assert events(split(REPLY, random.Random(seed))) == events([REPLY])
+
+
+def test_only_code_change_blocks_are_changes():
+    reply = "CONCEPT: Loops.\n```python\nprint(1)\n```\nCODE_CHANGE:\n```js\nconsole.log(1)\n```\n"
+    assert [kind for kind, *_ in events([reply])] == ["concept"]
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+import pytest
+
+import runner
+
+ANSWER = [{"name": "answer", "check": "answer == 42"}]
+
+
+@pytest.fixture(params=["fresh", "warm"])
+def code_runner(request):
+    if request.param == "fresh":
+        yield runner.ExerciseRunner(max_workers=2, timeout=2.0, cpu_seconds=1)
+    else:
+        pool = runner.WarmPool(size=1, max_runs=3, timeout=2.0, cpu_seconds=1)
+        yield pool
+        pool.close()
+
+
+def test_passing_run(code_runner):
+    verdict = code_runner.run("answer = 6 * 7\nprint('done')", ANSWER)
+    assert verdict.passed and verdict.error is None
+    assert verdict.output == "done\n"
+
+
+def test_failing_check_and_error(code_runner):
+    assert not code_runner.run("answer = 41", ANSWER).passed
+    verdict = code_runner.run("answer = 42 +", ANSWER)
+    assert not verdict.passed and "SyntaxError" in verdict.error
+    assert verdict.results == [{"name": "answer", "passed": False}]
+
+
+def test_sleeping_run_times_out(code_runner):
+    verdict = code_runner.run("import time\ntime.sleep(30)\nanswer = 42", ANSWER)
+    assert not verdict.passed and verdict.error.startswith("TimeoutError")
+    # The runner is still usable afterwards
+    assert code_runner.run("answer = 42", ANSWER).passed
+
+
+def test_spinning_run_is_killed(code_runner):
+    verdict = code_runner.run("while True:\n    pass", ANSWER)
+    assert not verdict.passed
+    assert verdict.error in (runner.KILLED_OUTCOME, runner.TIMEOUT_OUTCOME.format(timeout=2.0))
+    assert code_runner.run("answer = 42", ANSWER).passed
+
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Killed children of an init that does not reap them linger as zombies
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def dies(pid, timeout=2.0):
+    # SIGKILL is delivered asynchronously, so give it a moment
+    deadline = time.monotonic() + timeout
+    while alive(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="isolation relies on POSIX limits")
+def test_run_is_isolated_from_the_app(code_runner, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "secret")
+    code = """
+import os, subprocess
+secrets = [name for name in os.environ if 'KEY' in name]
+cwd = os.getcwd()
+try:
+    with open('notes.txt', 'w') as f:
+        f.write('x' * 10)
+    wrote = True
+except OSError:
+    wrote = False
+try:
+    # Refused by RLIMIT_NPROC, except for root; then the process group kill ends it
+    print(subprocess.Popen(['sleep', '30']).pid)
+except OSError:
+    pass
+"""
+    checks = [
+        {"name": "no secrets", "check": "secrets == []"},
+        {"name": "scratch dir", "check": f"cwd != {os.getcwd()!r}"},
+        {"name": "no files", "check": "not wrote"},
+    ]
+    verdict = code_runner.run(code, checks)
+    assert verdict.error is None
+    assert verdict.results == [{"name": check["name"], "passed": True} for check in checks]
+    for pid in verdict.output.split():
+        assert dies(int(pid))
+
+
+def test_redefined_builtins_cannot_fake_a_pass(code_runner):
+    code = "def len(value):\n    return 5\nprint('hi')"
+    verdict = code_runner.run(code, [{"name": "five chars", "check": "len(output) == 5"}])
+    assert not verdict.passed
+
+
+def test_warm_runs_do_not_share_state():
+    pool = runner.WarmPool(size=1, max_runs=5, timeout=2.0)
+    try:
+        pool.run("import math\nmath.pi = 3\nanswer = 42")
+        verdict = pool.run("import math", [{"name": "pi", "check": "math.pi > 3.1"}])
+        assert verdict.passed
+    finally:
+        pool.close()
+
+
+def test_full_pool_answers_busy():
+    pool = runner.WarmPool(size=1, max_queue=0, queue_timeout=0.2, timeout=2.0)
+    try:
+        slow = threading.Thread(target=pool.run, args=("import time\ntime.sleep(1)",))
+        slow.start()
+        threading.Event().wait(0.3)
+        verdict = pool.run("answer = 42", ANSWER)
+        slow.join()
+        assert verdict.error == runner.BUSY_OUTCOME
+    finally:
+        pool.close()
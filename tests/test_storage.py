@@ -0,0 +1,188 @@
+import json
+import time
+
+import pytest
+
+import storage
+
+
+def write_json_deployment(directory):
+    (directory / "users.json").write_text(json.dumps({"ada": "hash-a", "bob": "hash-b"}))
+    progress = storage.default_progress()
+    progress.update(total_points=40, completed_lessons=["variables"])
+    (directory / "progress_ada.json").write_text(json.dumps(progress))
+
+
+def test_empty_database_imports_a_json_deployment(tmp_path, monkeypatch):
+    write_json_deployment(tmp_path)
+    monkeypatch.setattr(storage, "LEGACY_JSON_DIR", str(tmp_path))
+
+    store = storage.open_storage("sqlite", str(tmp_path / "lexiq.db"))
+    assert store.load_users() == {"ada": "hash-a", "bob": "hash-b"}
+    assert store.load_progress("ada")["total_points"] == 40
+    store.close()
+
+
+def test_database_with_accounts_is_not_reimported(tmp_path, monkeypatch):
+    write_json_deployment(tmp_path)
+    monkeypatch.setattr(storage, "LEGACY_JSON_DIR", str(tmp_path))
+    store = storage.open_storage("sqlite", str(tmp_path / "lexiq.db"))
+    store.create_user("carol", "hash-c")
+    store.close()
+
+    (tmp_path / "users.json").write_text(json.dumps({"dave": "hash-d"}))
+    store = storage.open_storage("sqlite", str(tmp_path / "lexiq.db"))
+    assert "dave" not in store.load_users()
+    store.close()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    location = str(tmp_path / "lexiq.db") if request.param == "sqlite" else str(tmp_path)
+    store = storage.open_storage(request.param, location)
+    yield store
+    store.close()
+
+
+def test_accounts(store):
+    assert store.create_user("ada", "hash-a") is not None
+    assert store.create_user("ada", "other") is None
+    assert store.get_user("ada") == "hash-a"
+    assert store.get_user("bob") is None
+
+
+def test_user_directory_sees_signups_from_another_process(store):
+    directory = storage.UserDirectory(store)
+    assert directory.create("ada", "hash-a")
+    assert not directory.create("ada", "other")
+    # Another worker writes straight to the store
+    time.sleep(0.01)
+    store.create_user("bob", "hash-b")
+    assert directory.get("bob") == "hash-b" and len(directory) == 2
+
+
+def test_progress_round_trip(store):
+    progress = storage.default_progress()
+    progress.update(current_track="Basics", quiz_scores={"variables": 3})
+    store.save_progress("ada", progress)
+    assert store.load_progress("ada") == progress
+
+    # A partial save leaves the other fields as they were
+    store.save_progress("ada", {"current_track": "Loops", "quiz_scores": {}}, ["current_track"])
+    assert store.load_progress("ada") == dict(progress, current_track="Loops")
+    assert store.load_progress("bob") is None
+
+
+def test_writer_saves_only_changed_fields(store):
+    store.save_progress("ada", storage.default_progress())
+    writer = storage.ProgressWriter(store, interval=60)
+    progress = storage.default_progress()
+    progress.update(store.load_progress("ada"))
+    writer.track("ada", store.load_progress("ada"), "tab")
+
+    assert writer.mark("ada", progress, "tab") == set()
+    progress["current_track"] = "Loops"
+    assert writer.mark("ada", progress, "tab") == {"current_track"}
+    writer.flush()
+    assert store.load_progress("ada")["current_track"] == "Loops"
+    assert writer.writes == 1
+    writer.close()
+
+
+def test_writer_fills_fields_storage_lacks(store):
+    store.save_progress("ada", {"current_track": "Basics"})
+    writer = storage.ProgressWriter(store, interval=60)
+    progress = storage.default_progress()
+    progress.update(store.load_progress("ada"))
+    writer.track("ada", store.load_progress("ada"), "tab")
+
+    changed = writer.mark("ada", progress, "tab")
+    assert "current_track" not in changed and "quiz_scores" in changed
+    writer.close()
+    assert "quiz_scores" in store.load_progress("ada")
+
+
+def test_writer_forgets_idle_sessions(store):
+    writer = storage.ProgressWriter(store, interval=60, session_ttl=10)
+    writer.track("ada", {}, "closed tab")
+    writer.track("ada", {}, "open tab")
+    writer.mark("ada", storage.default_progress(), "open tab")
+    writer._touched[("ada", "closed tab")] -= 60
+    assert writer.evict() == 1
+    assert list(writer._seen) == [("ada", "open tab")]
+    writer.close()
+
+
+def test_event_replay_matches_the_saved_document(store):
+    # A legacy document from before the event log; its points are the starting values
+    legacy = storage.default_progress()
+    legacy.update(total_points=15, completed_lessons=["variables"])
+    store.save_progress("ada", legacy)
+
+    log = storage.ProgressLog(store, snapshot_every=3)
+    expected = store.load_progress("ada")
+    assert log.load("ada", store.load_progress("ada")) == expected
+    for number in range(8):
+        ref = f"lesson_{number}" if number % 2 else None
+        log.record("ada", "lesson" if ref else "quiz", 10, ref)
+        storage.apply_event(expected, "lesson", 10, ref)
+
+    loaded = log.load("ada", storage.default_progress())
+    assert loaded["total_points"] == expected["total_points"] == 95
+    assert loaded["completed_lessons"] == expected["completed_lessons"]
+    # Only the events since the last snapshot are replayed
+    snapshot_id, _ = store.load_snapshot("ada")
+    assert len(store.events_after("ada", snapshot_id)) < 3
+
+
+def test_pruned_log_replays_the_same_state(store):
+    log = storage.ProgressLog(store, snapshot_every=2, prune=True)
+    log.load("ada", storage.default_progress())
+    for _ in range(5):
+        log.record("ada", "quiz", 5)
+    assert log.load("ada", storage.default_progress())["total_points"] == 25
+    assert len(log.history("ada")) < 2
+
+
+def test_points_by_user_counts_snapshots_and_events(store):
+    for name in ("ada", "bob"):
+        store.create_user(name, "hash")
+    log = storage.ProgressLog(store, snapshot_every=2)
+    log.load("ada", storage.default_progress())
+    for _ in range(3):
+        log.record("ada", "quiz", 10)
+    store.save_progress("bob", dict(storage.default_progress(), total_points=7))
+
+    points, last_event = store.points_by_user()
+    assert points == {"ada": 30, "bob": 7}
+    assert last_event == store.events_after("ada", 0)[-1][0]
+
+
+def test_state_versions_conflict(store):
+    assert store.load_state("ada", "workspace") == (0, None)
+    version = store.save_state("ada", "workspace", {"code": "x = 1"}, 0)
+    with pytest.raises(storage.StateConflict) as conflict:
+        store.save_state("ada", "workspace", {"code": "x = 2"}, 0)
+    assert conflict.value.value == {"code": "x = 1"}
+    assert store.load_state("ada", "workspace") == (version, {"code": "x = 1"})
+
+
+def test_transcript_pages_in_older_segments(store):
+    transcripts = storage.TranscriptStore(store, {}, segment_size=2, window_segments=2)
+    messages = [{"role": "user", "content": f"question {n}"} for n in range(5)]
+    transcripts.save("ada", "chat", messages)
+
+    loaded = transcripts.load("ada", "chat")
+    assert loaded.start == 2 and list(loaded) == messages[2:]
+    assert transcripts.load_older("ada", "chat", loaded)
+    assert not transcripts.load_older("ada", "chat", loaded)
+    assert list(loaded) == messages
+
+
+def test_transcripts_of_similar_names_stay_apart(store):
+    transcripts = storage.TranscriptStore(store, {})
+    # User "a"'s project segments share a file name prefix with everything of user "a_project"
+    transcripts.save("a", "project", [{"role": "user", "content": "mine"}])
+    transcripts.save("a_project", "assistant", [{"role": "user", "content": "theirs"}] * 3)
+    assert [m["content"] for m in transcripts.load("a", "project")] == ["mine"]
+    assert store.last_segment("a", "project") == (0, 1)